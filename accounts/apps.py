@@ -10,3 +10,9 @@ class AccountsConfig(AppConfig):
     """
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        """
+        Connect the signal handlers of the app
+        """
+        from . import signals  # pylint: disable=import-outside-toplevel,unused-import
@@ -0,0 +1,195 @@
+"""
+In-process prefix index serving the search-as-you-type completions.
+
+The index holds the book titles, authors and tag names in sorted arrays and
+finds completions for a prefix with ``bisect``, so keystrokes never reach the
+database. It is loaded from the database on first use and then kept up to
+date by the Book and Tag signals once their changes are committed.
+
+Every change also bumps a version counter in the shared cache. A worker whose
+index was loaded under an older version, because another worker made the
+change, loads it again. The version is read at most every few seconds, so
+most keystrokes don't even reach the cache.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from django.db import transaction
+from .cards import bump_version, get_versions
+from .models import Book, Tag
+
+DEFAULT_LIMIT = 8
+INDEX_VERSION_KEY = 'prefix_index_version'
+# Seconds between two reads of the shared version
+INDEX_CHECK_INTERVAL = 5
+
+TITLE = 'title'
+AUTHOR = 'author'
+TAG = 'tag'
+
+
+def normalize(text: str) -> str:
+    """
+    Lower-case and collapse the whitespace of a completion or a typed prefix.
+    """
+    return re.sub(r'\s+', ' ', (text or '').lower()).strip()
+
+
+class PrefixIndex:
+    """
+    Sorted array of ``(key, kind, text, id)`` entries searchable by key prefix.
+
+    Every word of a title or author starts an entry, so "kings" completes
+    "The Way of Kings". Titles and authors are ranked before tags.
+    """
+    def __init__(self):
+        self._entries = []
+        self._by_item = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.version = None
+        self.checked_at = 0.0
+
+    @staticmethod
+    def _keys(text):
+        """
+        The suffixes of ``text`` starting at each of its words.
+        """
+        words = normalize(text).split(' ')
+        return {' '.join(words[position:]) for position in range(len(words)) if words[position]}
+
+    def load(self, books, tags):
+        """
+        Replace the content of the index with ``(id, title, author)`` books and ``(id, name)`` tags.
+        """
+        entries, by_item = [], {}
+        for book_id, title, author in books:
+            for kind, text in ((TITLE, title), (AUTHOR, author)):
+                if text:
+                    item_entries = [(key, kind, text, book_id) for key in self._keys(text)]
+                    by_item[(kind, book_id)] = item_entries
+                    entries.extend(item_entries)
+        for tag_id, name in tags:
+            if name:
+                item_entries = [(key, TAG, name, tag_id) for key in self._keys(name)]
+                by_item[(TAG, tag_id)] = item_entries
+                entries.extend(item_entries)
+        entries.sort()
+        with self._lock:
+            self._entries, self._by_item = entries, by_item
+            self.loaded = True
+
+    def _remove(self, kind, item_id):
+        for entry in self._by_item.pop((kind, item_id), []):
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+
+    def _add(self, kind, item_id, text):
+        if not text:
+            return
+        item_entries = [(key, kind, text, item_id) for key in self._keys(text)]
+        self._by_item[(kind, item_id)] = item_entries
+        for entry in item_entries:
+            insort(self._entries, entry)
+
+    def update_book(self, book_id, title, author):
+        """
+        Add or refresh the title and author of a book.
+        """
+        with self._lock:
+            for kind, text in ((TITLE, title), (AUTHOR, author)):
+                self._remove(kind, book_id)
+                self._add(kind, book_id, text)
+
+    def remove_book(self, book_id):
+        """
+        Remove the title and author of a deleted book.
+        """
+        with self._lock:
+            self._remove(TITLE, book_id)
+            self._remove(AUTHOR, book_id)
+
+    def update_tag(self, tag_id, name):
+        """
+        Add or refresh a tag name.
+        """
+        with self._lock:
+            self._remove(TAG, tag_id)
+            self._add(TAG, tag_id, name)
+
+    def remove_tag(self, tag_id):
+        """
+        Remove a deleted tag.
+        """
+        with self._lock:
+            self._remove(TAG, tag_id)
+
+    def complete(self, prefix: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        """
+        Return up to ``limit`` distinct completions starting with ``prefix``.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        entries = self._entries
+        position = bisect_left(entries, (prefix,))
+        titles, others, seen = [], [], set()
+        # Scan a bounded window so a very common prefix stays cheap
+        for key, kind, text, item_id in entries[position:position + limit * 20]:
+            if not key.startswith(prefix):
+                break
+            if (kind, item_id) in seen:
+                continue
+            seen.add((kind, item_id))
+            completion = {'kind': kind, 'text': text, 'id': item_id}
+            (titles if kind == TITLE else others).append(completion)
+        return (titles + others)[:limit]
+
+
+prefix_index = PrefixIndex()
+
+
+def _index_version():
+    return get_versions([INDEX_VERSION_KEY])[INDEX_VERSION_KEY]
+
+def load_prefix_index():
+    """
+    Load the prefix index from the Book and Tag tables.
+    """
+    # Read before loading, so changes committed meanwhile trigger another load
+    version = _index_version()
+    prefix_index.load(Book.objects.values_list('id', 'title', 'author').iterator(),
+                      Tag.objects.values_list('id', 'name'))
+    prefix_index.version = version
+    prefix_index.checked_at = time.monotonic()
+
+def update_on_commit(update, *args):
+    """
+    Apply ``update(*args)`` to the prefix index once the transaction commits,
+    and bump the shared version so the other workers reload theirs.
+    """
+    def apply():
+        if prefix_index.loaded:
+            update(*args)
+        version = bump_version(INDEX_VERSION_KEY)
+        # Only a single bump since the load means this worker saw every change
+        if prefix_index.loaded and version == prefix_index.version + 1:
+            prefix_index.version = version
+    prefix_index.checked_at = time.monotonic()
+
+    transaction.on_commit(apply)
+
+def complete(prefix: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+    """
+    Return the completions of ``prefix``, loading the index the first time it
+    is needed and again after another worker changed it.
+    """
+    if not prefix_index.loaded:
+        load_prefix_index()
+    elif time.monotonic() - prefix_index.checked_at >= INDEX_CHECK_INTERVAL:
+        prefix_index.checked_at = time.monotonic()
+        if prefix_index.version != _index_version():
+            load_prefix_index()
+    return prefix_index.complete(prefix, limit)
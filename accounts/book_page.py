@@ -0,0 +1,49 @@
+"""
+Data and caching for the book details page.
+
+The page is loaded in a fixed number of queries: the book, its tags, and one
+page of reviews with their authors. The version anonymous visitors see is
+cached as a rendered fragment, keyed by the book, tag and review versions so
+it is dropped as soon as the book or its reviews change.
+"""
+from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404
+from .cards import TAG_VERSION_KEY, book_version_key, bump_version, get_versions
+from .models import Book
+
+REVIEWS_PER_PAGE = 10
+BOOK_PAGE_TIMEOUT = 60 * 60
+
+
+def review_version_key(book_id: int) -> str:
+    """
+    Cache key of the version counter of the reviews of a book.
+    """
+    return f'book_review_version:{book_id}'
+
+def bump_review_version(book_id: int):
+    """
+    Invalidate the cached pages of a book after one of its reviews changed.
+    """
+    bump_version(review_version_key(book_id))
+
+def book_page_cache_key(book_id: int, page_number: int) -> str:
+    """
+    Cache key of the anonymous version of one page of a book's details.
+    """
+    keys = [book_version_key(book_id), TAG_VERSION_KEY, review_version_key(book_id)]
+    versions = get_versions(keys)
+    return f'book_page:{book_id}:{page_number}:' + ':'.join(str(versions[key]) for key in keys)
+
+def load_book_page(book_id: int, page_number: int) -> dict:
+    """
+    Load the book with its tags and one page of its reviews with their authors.
+    """
+    book = get_object_or_404(Book.objects.prefetch_related('tags'), id=book_id)
+    reviews = (book.reviews.select_related('user')
+               .only('stars', 'content', 'data_created', 'book_id', 'user__username')
+               .order_by('-data_created', '-id'))
+    return {
+        'book': book,
+        'reviews': Paginator(reviews, REVIEWS_PER_PAGE).get_page(page_number),
+    }
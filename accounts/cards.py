@@ -0,0 +1,104 @@
+"""
+Fragment cache for the rendered book cards of the catalog pages.
+
+Each card is cached under the book id, the book's version counter, the
+global tag version and the book price. The versions are bumped from the
+Book and Tag signals, and keeping the price in the key means a card can
+never show a stale price, even after a bulk ``update()`` that sends no signal.
+"""
+import time
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Card markup used by each listing page
+CARD_TEMPLATES = {
+    'dashboard': 'accounts/cards/dashboard.html',
+    'bestseller': 'accounts/cards/bestseller.html',
+    'coming_soon': 'accounts/cards/coming_soon.html',
+    'search': 'accounts/cards/search.html',
+}
+
+CARD_TIMEOUT = 60 * 60 * 24
+TAG_VERSION_KEY = 'book_card_version:tags'
+
+
+def book_version_key(book_id: int) -> str:
+    """
+    Cache key of the version counter of a book.
+    """
+    return f'book_card_version:{book_id}'
+
+def _new_version():
+    """
+    A version that was never handed out before, so a counter evicted from the
+    cache can't bring back a fragment rendered under an old version.
+    """
+    return time.time_ns()
+
+def bump_version(key: str):
+    """
+    Increment the version counter stored under ``key`` and return the new version.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _new_version()
+        cache.set(key, version, None)
+        return version
+
+def get_versions(keys: list[str]) -> dict:
+    """
+    Return the version counters stored under ``keys`` in one cache round trip,
+    starting the missing ones.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # add() keeps the value of a concurrent request that got there first
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+def bump_card_version(book_id: int):
+    """
+    Invalidate every cached card of a book.
+    """
+    bump_version(book_version_key(book_id))
+
+def bump_tag_version():
+    """
+    Invalidate every cached card after a tag changed.
+    """
+    bump_version(TAG_VERSION_KEY)
+
+def card_versions(book_ids) -> dict:
+    """
+    Return the current version of each book, and of the tags, in one cache round trip.
+    """
+    return get_versions([book_version_key(book_id) for book_id in book_ids] + [TAG_VERSION_KEY])
+
+def render_cards(books, variant: str) -> str:
+    """
+    Render the cards of ``books`` for a listing page, reusing the cached
+    fragments and only rendering the cards that are missing.
+    """
+    books = list(books)
+    if not books:
+        return ''
+    template = CARD_TEMPLATES[variant]
+    versions = card_versions(book.id for book in books)
+    tag_version = versions[TAG_VERSION_KEY]
+    keys = [f'book_card:{variant}:{book.id}:{versions[book_version_key(book.id)]}:'
+            f'{tag_version}:{book.price}' for book in books]
+
+    fragments = cache.get_many(keys)
+    missing = {}
+    for key, book in zip(keys, books):
+        if key not in fragments:
+            missing[key] = render_to_string(template, {'book': book})
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        fragments.update(missing)
+
+    return mark_safe(''.join(fragments[key] for key in keys))
@@ -0,0 +1,143 @@
+"""
+Facets and facet filters for the search results.
+
+The tag, author, price and publication decade of every matching book are
+read in a single query, and all facet counts and filters are computed from
+those rows in one pass, so adding a facet doesn't add a query.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from django.http import QueryDict
+from .models import Book, Tag
+
+# Price buckets as (lowest price, price the bucket stops at)
+PRICE_BUCKETS = ((0, 10), (10, 20), (20, 30), (30, None))
+
+FACET_NAMES = ('tag', 'author', 'price', 'decade')
+
+
+def _bucket_key(low, high):
+    return f'{low}-{high}' if high is not None else f'{low}+'
+
+PRICE_KEYS = frozenset(_bucket_key(low, high) for low, high in PRICE_BUCKETS)
+
+
+def price_bucket(price) -> str:
+    """
+    Key of the price bucket a price falls in, e.g. "10-20" or "30+".
+    """
+    for low, high in PRICE_BUCKETS:
+        if high is None or price < high:
+            return _bucket_key(low, high)
+    return ''
+
+def _price_label(key):
+    return f'${key}' if key.endswith('+') else '$' + key.replace('-', ' - $')
+
+
+@dataclass
+class FacetedResults:
+    """
+    The ids of the filtered results and the facets to refine them further.
+    """
+    book_ids: list = field(default_factory=list)
+    facets: dict = field(default_factory=dict)
+
+
+def parse_filters(params: QueryDict) -> dict[str, set]:
+    """
+    Read the selected facet values from the query string. Values of one facet
+    are combined with OR, different facets with AND. Unknown price buckets, and
+    tags and decades that aren't a number are left out.
+    """
+    valid = {
+        'tag': str.isdigit,
+        'price': PRICE_KEYS.__contains__,
+        'decade': str.isdigit,
+    }
+    filters = {}
+    for name in FACET_NAMES:
+        values = {value for value in params.getlist(name) if valid.get(name, bool)(value)}
+        if values:
+            filters[name] = values
+    return filters
+
+def _toggle_url(params, name, value):
+    """
+    Query string selecting or unselecting one facet value.
+    """
+    params = params.copy()
+    values = params.getlist(name)
+    if value in values:
+        values.remove(value)
+    else:
+        values.append(value)
+    params.setlist(name, values)
+    return '?' + params.urlencode()
+
+def facet_search(book_ids: list[int], params: QueryDict) -> FacetedResults:
+    """
+    Filter the ranked ``book_ids`` with the facets selected in ``params`` and
+    count the facet values of what is left.
+    """
+    filters = parse_filters(params)
+    rows = Book.objects.filter(id__in=book_ids).values_list(
+        'id', 'author', 'price', 'publication', 'tags__id', 'tags__name')
+
+    books, tag_names = {}, {}
+    for book_id, author, price, publication, tag_id, tag_name in rows:
+        book = books.setdefault(book_id, {
+            'author': author or '',
+            'price': price_bucket(price),
+            'decade': str(publication.year // 10 * 10),
+            'tag': set(),
+        })
+        if tag_id is not None:
+            book['tag'].add(str(tag_id))
+            tag_names[str(tag_id)] = tag_name
+
+    def selected(book):
+        for name, values in filters.items():
+            book_values = book[name] if name == 'tag' else {book[name]}
+            if not book_values & values:
+                return False
+        return True
+
+    counts = {name: Counter() for name in FACET_NAMES}
+    matching = []
+    for book_id in book_ids:
+        book = books.get(book_id)
+        if book is None or not selected(book):
+            continue
+        matching.append(book_id)
+        counts['tag'].update(book['tag'])
+        for name in ('author', 'price', 'decade'):
+            counts[name][book[name]] += 1
+
+    # Selected tags none of the matches have are named from the tags table
+    unnamed = filters.get('tag', set()) - set(tag_names)
+    if unnamed:
+        tag_names.update((str(tag_id), name) for tag_id, name in
+                         Tag.objects.filter(id__in=unnamed).values_list('id', 'name'))
+
+    labels = {
+        'tag': tag_names.get,
+        'author': lambda value: value,
+        'price': _price_label,
+        'decade': lambda value: f'{value}s',
+    }
+    facets = {}
+    for name in FACET_NAMES:
+        values = set(counts[name]) | filters.get(name, set())
+        if name in ('price', 'decade'):
+            ordered = sorted(values, key=lambda value: int(value.rstrip('+').split('-')[0]))
+        else:
+            ordered = sorted(values, key=lambda value: (-counts[name][value], str(value)))
+        facets[name] = [{
+            'value': value,
+            'label': labels[name](value) or value,
+            'count': counts[name][value],
+            'selected': value in filters.get(name, set()),
+            'url': _toggle_url(params, name, value),
+        } for value in ordered]
+    return FacetedResults(book_ids=matching, facets=facets)
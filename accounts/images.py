@@ -0,0 +1,111 @@
+"""
+Resized and re-encoded derivatives of the book cover images.
+
+Every uploaded cover gets, for each display size, a JPEG and a WebP version
+at 1x and 2x resolution, so the pages never ship the multi-megabyte original
+into a 287x410 slot. Derivatives live next to the media files under
+``derivatives/`` and are named after the original image.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from PIL import Image, ImageOps
+
+DERIVATIVES_DIR = 'derivatives'
+
+# Display size of each variant and whether it is cropped to fill it exactly
+VARIANTS = {
+    'card': {'size': (287, 410), 'crop': True},
+    'detail': {'size': (450, 650), 'crop': False},
+}
+SCALES = (1, 2)
+FORMATS = {'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+           'webp': ('WEBP', {'quality': 80, 'method': 6})}
+
+
+def derivative_name(image_name: str, variant: str, scale: int, extension: str) -> str:
+    """
+    Name, relative to the media root, of one derivative of ``image_name``.
+    """
+    stem = os.path.splitext(image_name)[0]
+    suffix = f'{variant}@{scale}x' if scale > 1 else variant
+    return f'{DERIVATIVES_DIR}/{stem}_{suffix}.{extension}'
+
+def _media_path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+def has_derivatives(image_name: str) -> bool:
+    """
+    True when the derivatives of ``image_name`` have been generated.
+    """
+    last = derivative_name(image_name, list(VARIANTS)[-1], SCALES[-1], 'webp')
+    return os.path.exists(_media_path(last))
+
+def generate_derivatives(image_name: str, force: bool = False) -> list[str]:
+    """
+    Generate every derivative of one image and return their names.
+    Existing derivatives are kept unless ``force`` is set.
+    """
+    if not image_name or (not force and has_derivatives(image_name)):
+        return []
+    with Image.open(_media_path(image_name)) as original:
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        names = []
+        for variant, spec in VARIANTS.items():
+            for scale in SCALES:
+                size = (spec['size'][0] * scale, spec['size'][1] * scale)
+                if spec['crop']:
+                    resized = ImageOps.fit(original, size, Image.Resampling.LANCZOS)
+                else:
+                    resized = original.copy()
+                    resized.thumbnail(size, Image.Resampling.LANCZOS)
+                for extension, (image_format, options) in FORMATS.items():
+                    name = derivative_name(image_name, variant, scale, extension)
+                    os.makedirs(os.path.dirname(_media_path(name)), exist_ok=True)
+                    resized.save(_media_path(name), image_format, **options)
+                    names.append(name)
+    return names
+
+def _generate_or_none(image_name, force):
+    """
+    Process pool helper returning None instead of raising for an unreadable image.
+    """
+    try:
+        return generate_derivatives(image_name, force)
+    except OSError:
+        return None
+
+def generate_many(image_names, workers: int | None = None,
+                  force: bool = False) -> tuple[int, list[str]]:
+    """
+    Generate the derivatives of many images on a process pool.
+    Returns how many images were processed and the names of those that failed.
+    """
+    image_names = sorted(set(name for name in image_names if name))
+    generated, failed = 0, []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_generate_or_none, image_names, [force] * len(image_names),
+                           chunksize=8)
+        for image_name, names in zip(image_names, results):
+            if names is None:
+                failed.append(image_name)
+            elif names:
+                generated += 1
+    return generated, failed
+
+def image_sources(image_name: str, variant: str) -> dict | None:
+    """
+    URLs of the derivatives of an image for the ``srcset`` of a variant,
+    or None when they haven't been generated.
+    """
+    if not image_name or not has_derivatives(image_name):
+        return None
+
+    def url(scale, extension):
+        return settings.MEDIA_URL + derivative_name(image_name, variant, scale, extension)
+
+    return {
+        'src': url(1, 'jpg'),
+        'srcset': ', '.join(f'{url(scale, "jpg")} {scale}x' for scale in SCALES),
+        'webp_srcset': ', '.join(f'{url(scale, "webp")} {scale}x' for scale in SCALES),
+    }
@@ -0,0 +1,30 @@
+"""
+Management command that generates the resized book cover images.
+"""
+from django.core.management.base import BaseCommand
+from accounts.cards import bump_card_version
+from accounts.images import generate_many
+from accounts.models import Book
+
+
+class Command(BaseCommand):
+    """
+    Generate the card and detail derivatives of every book cover on a process pool.
+    """
+    help = 'Generate the resized and WebP versions of the book cover images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of worker processes (defaults to the CPU count)')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        books = list(Book.objects.exclude(image='').values_list('id', 'image'))
+        count, failed = generate_many([image for _, image in books],
+                                      workers=options['workers'], force=options['force'])
+        for book_id, _ in books:
+            bump_card_version(book_id)
+        for image_name in failed:
+            self.stderr.write(f'Could not read {image_name}')
+        self.stdout.write(self.style.SUCCESS(f'Generated derivatives for {count} images'))
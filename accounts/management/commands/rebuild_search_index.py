@@ -0,0 +1,18 @@
+"""
+Management command that rebuilds the book search index.
+"""
+from django.core.management.base import BaseCommand
+from accounts.search_index import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full-text search index from the books table.
+    """
+    help = 'Rebuild the book search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt with {type(backend).__name__}'))
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:08
+"""
+Module for 26 migration
+"""
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Twenty-sixth migration
+    """
+    dependencies = [
+        ('accounts', '0025_alter_productreviews_unique_together'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='productreviews',
+            options={'verbose_name_plural': 'Product Reviews'},
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['data_created', 'id'], name='book_created_id_idx'),
+        ),
+    ]
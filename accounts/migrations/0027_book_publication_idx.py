@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:11
+"""
+Module for 27 migration
+"""
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Twenty-seventh migration
+    """
+    dependencies = [
+        ('accounts', '0026_book_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publication'], name='book_publication_idx'),
+        ),
+    ]
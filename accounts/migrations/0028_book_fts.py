@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:20
+"""
+Module for 28 migration
+"""
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    """
+    Create and fill the FTS5 search index on SQLite
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS accounts_book_fts USING fts5("
+        "title, author, description, tags, tokenize='unicode61 remove_diacritics 2')"
+    )
+    Book = apps.get_model('accounts', 'Book')
+    for book in Book.objects.prefetch_related('tags'):
+        schema_editor.execute(
+            "INSERT INTO accounts_book_fts (rowid, title, author, description, tags) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [book.id, book.title or '', book.author or '', book.descreption or '',
+             ' '.join(tag.name or '' for tag in book.tags.all())]
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    """
+    Drop the FTS5 search index
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS accounts_book_fts")
+
+
+class Migration(migrations.Migration):
+    """
+    Twenty-eighth migration
+    """
+    dependencies = [
+        ('accounts', '0027_book_publication_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -87,6 +87,16 @@ class Book(models.Model):
     tags = models.ManyToManyField(Tag)
     image = models.ImageField(upload_to='static/images/', default='')
 
+    class Meta:
+        """
+        Index the keyset used to paginate the catalog listings and
+        the publication date used to find upcoming books
+        """
+        indexes = [
+            models.Index(fields=['data_created', 'id'], name='book_created_id_idx'),
+            models.Index(fields=['publication'], name='book_publication_idx'),
+        ]
+
     def __str__(self):
         return f'{self.title}'
 
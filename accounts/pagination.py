@@ -0,0 +1,90 @@
+"""
+Keyset (cursor) pagination for the book catalog listings.
+
+Pages are walked on the ``(data_created, id)`` pair instead of OFFSET, so the
+database only reads the rows of the requested page no matter how deep the
+visitor scrolls. Books without a creation date come first. The cursor handed
+to the client is an opaque, url-safe token.
+"""
+import base64
+import binascii
+import datetime
+from dataclasses import dataclass, field
+from django.db.models import F, Q, QuerySet
+
+# Columns used by the book cards on the listing pages
+CARD_FIELDS = ('id', 'title', 'author', 'price', 'publication', 'pages', 'cover',
+               'image', 'data_created')
+
+DEFAULT_PAGE_SIZE = 9
+MAX_PAGE_SIZE = 48
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor sent by the client cannot be decoded.
+    """
+
+
+@dataclass
+class KeysetPage:
+    """
+    One page of a keyset paginated listing.
+    """
+    books: list = field(default_factory=list)
+    next_cursor: str | None = None
+
+    @property
+    def has_next(self) -> bool:
+        """
+        True when there is at least one more page after this one.
+        """
+        return self.next_cursor is not None
+
+
+def encode_cursor(data_created: datetime.datetime | None, pk: int) -> str:
+    """
+    Build the opaque cursor pointing right after the given row.
+    """
+    raw = f'{data_created.isoformat() if data_created else ""}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime | None, int]:
+    """
+    Turn a cursor back into the ``(data_created, id)`` pair it was built from.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.datetime.fromisoformat(created) if created else None, int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def keyset_page(queryset: QuerySet, cursor: str | None = None,
+                per_page: int = DEFAULT_PAGE_SIZE) -> KeysetPage:
+    """
+    Return the page of ``queryset`` that starts right after ``cursor``.
+
+    One extra row is fetched to know whether a next page exists, so every page
+    costs a single indexed range scan of ``per_page + 1`` rows.
+    """
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    queryset = queryset.order_by(F('data_created').asc(nulls_first=True), 'id')
+    if cursor:
+        created, pk = decode_cursor(cursor)
+        if created is None:
+            queryset = queryset.filter(Q(data_created__isnull=False) |
+                                       Q(data_created__isnull=True, id__gt=pk))
+        else:
+            queryset = queryset.filter(Q(data_created__gt=created) |
+                                       Q(data_created=created, id__gt=pk))
+
+    books = list(queryset[:per_page + 1])
+    if len(books) <= per_page:
+        return KeysetPage(books=books)
+
+    books = books[:per_page]
+    last = books[-1]
+    return KeysetPage(books=books, next_cursor=encode_cursor(last.data_created, last.id))
@@ -0,0 +1,78 @@
+"""
+Precomputed release calendar for the coming soon page.
+
+The calendar of upcoming books is built once from an indexed range scan on
+``Book.publication`` and kept in the cache. Saving or deleting a book drops
+it, and the next visit of the page builds it again. The cache key carries the
+current date so books drop off the calendar on their release day.
+"""
+import datetime
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Book
+from .pagination import CARD_FIELDS
+
+RELEASE_CALENDAR_KEY = 'release_calendar'
+RELEASE_CALENDAR_TIMEOUT = 60 * 60 * 24
+
+# Ways the upcoming books can be grouped on the page
+GROUP_BY_MONTH = 'month'
+GROUP_BY_WEEK = 'week'
+
+
+def _group(books, start_of, label_of):
+    """
+    Group books already sorted by publication date into consecutive periods.
+    """
+    groups = []
+    for book in books:
+        start = start_of(book.publication)
+        if not groups or groups[-1]['start'] != start:
+            groups.append({'start': start, 'label': label_of(start), 'books': []})
+        groups[-1]['books'].append(book)
+    return groups
+
+def build_release_calendar(today: datetime.date | None = None) -> dict:
+    """
+    Build the calendar of books published after ``today``, grouped by month and by week.
+    """
+    today = today or timezone.localdate()
+    books = list(Book.objects.filter(publication__gt=today)
+                 .only(*CARD_FIELDS)
+                 .order_by('publication', 'id'))
+    return {
+        GROUP_BY_MONTH: _group(books,
+                               lambda day: day.replace(day=1),
+                               lambda start: start.strftime('%B %Y')),
+        GROUP_BY_WEEK: _group(books,
+                              lambda day: day - datetime.timedelta(days=day.weekday()),
+                              lambda start: f"Week of {start.strftime('%d %B %Y')}"),
+    }
+
+def _cache_key(today):
+    return f'{RELEASE_CALENDAR_KEY}:{today.isoformat()}'
+
+def release_calendar(today: datetime.date | None = None) -> dict:
+    """
+    Return today's release calendar, building it only if it is not cached yet.
+    """
+    today = today or timezone.localdate()
+    calendar = cache.get(_cache_key(today))
+    if calendar is None:
+        calendar = refresh_release_calendar(today)
+    return calendar
+
+def refresh_release_calendar(today: datetime.date | None = None) -> dict:
+    """
+    Rebuild today's release calendar and store it in the cache.
+    """
+    today = today or timezone.localdate()
+    calendar = build_release_calendar(today)
+    cache.set(_cache_key(today), calendar, RELEASE_CALENDAR_TIMEOUT)
+    return calendar
+
+def invalidate_release_calendar(today: datetime.date | None = None):
+    """
+    Drop today's release calendar, so the next request builds it again.
+    """
+    cache.delete(_cache_key(today or timezone.localdate()))
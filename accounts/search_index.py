@@ -0,0 +1,166 @@
+"""
+Full-text search over the book catalog.
+
+Searches go through a pluggable backend chosen with the ``BOOK_SEARCH_BACKEND``
+setting. On SQLite the default backend keeps an FTS5 index over the title,
+author, description and tag names of every book, ranked with bm25. Other
+databases fall back to the plain ``icontains`` query.
+"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from .models import Book
+
+FTS_TABLE = 'accounts_book_fts'
+
+# bm25 weights of the title, author, description and tags columns
+FTS_WEIGHTS = (10.0, 5.0, 1.0, 3.0)
+
+DEFAULT_LIMIT = 60
+REBUILD_BATCH_SIZE = 1000
+
+
+class SearchBackend:
+    """
+    Interface of the search backends.
+    """
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> list[int]:
+        """
+        Return the ids of the books matching ``query``, most relevant first.
+        """
+        raise NotImplementedError
+
+    def index_books(self, book_ids):
+        """
+        Add or refresh the given books in the index.
+        """
+
+    def remove_books(self, book_ids):
+        """
+        Remove the given books from the index.
+        """
+
+    def rebuild(self):
+        """
+        Rebuild the whole index from the books table.
+        """
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Backend without an index, matching the title, author or tag names with ``icontains``.
+    """
+    def search(self, query, limit=DEFAULT_LIMIT):
+        query = query.strip()
+        if not query:
+            return []
+        return list(Book.objects.filter(Q(title__icontains=query) |
+                                        Q(author__icontains=query) |
+                                        Q(tags__name__icontains=query))
+                    .distinct()
+                    .values_list('id', flat=True)[:limit])
+
+
+def match_expression(query: str) -> str:
+    """
+    Turn what the user typed into an FTS5 query where every word must match
+    as a prefix, so "three bod" finds "The Three-Body Problem".
+    """
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Backend using an SQLite FTS5 table whose rowid is the book id.
+    """
+    def search(self, query, limit=DEFAULT_LIMIT):
+        expression = match_expression(query)
+        if not expression:
+            return []
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+                [expression, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def _documents(self, book_ids=None):
+        """
+        Load the indexed text of the books, with their tag names, in two queries.
+        """
+        books = Book.objects.all()
+        tags = Book.tags.through.objects.all()
+        if book_ids is not None:
+            books = books.filter(id__in=book_ids)
+            tags = tags.filter(book_id__in=book_ids)
+
+        tag_names = defaultdict(list)
+        for book_id, name in tags.values_list('book_id', 'tag__name'):
+            tag_names[book_id].append(name or '')
+
+        for book_id, title, author, description in books.values_list(
+                'id', 'title', 'author', 'descreption').iterator():
+            yield (book_id, title or '', author or '', description or '',
+                   ' '.join(tag_names[book_id]))
+
+    def index_books(self, book_ids):
+        book_ids = list(book_ids)
+        if not book_ids:
+            return
+        self.remove_books(book_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, author, description, tags) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                list(self._documents(book_ids)))
+
+    def remove_books(self, book_ids):
+        book_ids = list(book_ids)
+        if not book_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(book_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+
+    def rebuild(self):
+        documents = self._documents()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            while batch := list(islice(documents, REBUILD_BATCH_SIZE)):
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, title, author, description, tags) '
+                    'VALUES (%s, %s, %s, %s, %s)',
+                    batch)
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> SearchBackend:
+    """
+    Return the configured search backend, FTS5 on SQLite by default.
+    """
+    path = getattr(settings, 'BOOK_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return DatabaseSearchBackend()
+
+def books_in_order(book_ids: list[int]) -> list[Book]:
+    """
+    Load the given books with one query, keeping the order of ``book_ids``.
+    """
+    books = Book.objects.in_bulk(book_ids)
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+def search_books(query: str, limit: int = DEFAULT_LIMIT) -> list[Book]:
+    """
+    Return the books matching ``query`` in relevance order.
+    """
+    return books_in_order(get_search_backend().search(query, limit))
@@ -0,0 +1,162 @@
+"""
+Signal handlers keeping the precomputed and cached catalog data in sync with the books.
+"""
+import logging
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .autocomplete import prefix_index, update_on_commit
+from .book_page import bump_review_version
+from .cards import bump_card_version, bump_tag_version
+from .images import generate_derivatives, has_derivatives
+from .models import Book, ProductReviews, Tag
+from .releases import invalidate_release_calendar
+from .search_index import get_search_backend
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=Book)
+def refresh_releases(sender, instance, **kwargs):
+    """
+    Drop the cached release calendar once the changed book is committed. Only
+    the next visit of the coming soon page builds it again, however many books
+    were saved.
+    """
+    transaction.on_commit(invalidate_release_calendar)
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_cards(sender, instance, **kwargs):
+    """
+    Drop the cached cards of a changed or deleted book.
+    """
+    bump_card_version(instance.id)
+
+@receiver(m2m_changed, sender=Book.tags.through)
+def invalidate_tagged_book_cards(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached cards of books whose tags were changed, from either side of the relation.
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_card_version(instance.id)
+    elif pk_set:
+        for book_id in pk_set:
+            bump_card_version(book_id)
+    else:
+        # Tag.book_set.clear() doesn't say which books lost the tag
+        bump_tag_version()
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_cards(sender, instance, **kwargs):
+    """
+    Drop every cached card when a tag is renamed or deleted.
+    """
+    bump_tag_version()
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    """
+    Add a saved book to the search index.
+    """
+    get_search_backend().index_books([instance.id])
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    """
+    Remove a deleted book from the search index.
+    """
+    get_search_backend().remove_books([instance.id])
+
+@receiver(m2m_changed, sender=Book.tags.through)
+def index_book_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Refresh the indexed tag names of books whose tags changed.
+    """
+    if reverse and action == 'pre_clear':
+        # Tag.book_set.clear() doesn't say which books lose the tag
+        instance.cleared_book_ids = list(instance.book_set.values_list('id', flat=True))
+    elif action.startswith('post_'):
+        if not reverse:
+            book_ids = [instance.id]
+        else:
+            book_ids = pk_set or getattr(instance, 'cleared_book_ids', [])
+        get_search_backend().index_books(book_ids)
+
+@receiver(post_save, sender=Tag)
+def index_tag_books(sender, instance, created, **kwargs):
+    """
+    Refresh the books of a renamed tag in the search index.
+    """
+    if not created:
+        get_search_backend().index_books(instance.book_set.values_list('id', flat=True))
+
+@receiver(pre_delete, sender=Tag)
+def index_deleted_tag_books(sender, instance, **kwargs):
+    """
+    Refresh the books of a deleted tag once the tag is gone.
+    """
+    book_ids = list(instance.book_set.values_list('id', flat=True))
+    transaction.on_commit(lambda: get_search_backend().index_books(book_ids))
+
+
+@receiver(post_save, sender=Book)
+def complete_book(sender, instance, **kwargs):
+    """
+    Add a saved book to the autocomplete prefix index once it is committed.
+    """
+    update_on_commit(prefix_index.update_book, instance.id, instance.title, instance.author)
+
+@receiver(post_delete, sender=Book)
+def uncomplete_book(sender, instance, **kwargs):
+    """
+    Remove a deleted book from the autocomplete prefix index once it is committed.
+    """
+    update_on_commit(prefix_index.remove_book, instance.id)
+
+@receiver(post_save, sender=Tag)
+def complete_tag(sender, instance, **kwargs):
+    """
+    Add a saved tag to the autocomplete prefix index once it is committed.
+    """
+    update_on_commit(prefix_index.update_tag, instance.id, instance.name)
+
+@receiver(post_delete, sender=Tag)
+def uncomplete_tag(sender, instance, **kwargs):
+    """
+    Remove a deleted tag from the autocomplete prefix index once it is committed.
+    """
+    update_on_commit(prefix_index.remove_tag, instance.id)
+
+
+@receiver([post_save, post_delete], sender=ProductReviews)
+def invalidate_book_page(sender, instance, **kwargs):
+    """
+    Drop the cached details pages of a book when one of its reviews changes.
+    """
+    bump_review_version(instance.book_id)
+
+
+@receiver(post_save, sender=Book)
+def build_image_derivatives(sender, instance, **kwargs):
+    """
+    Generate the resized covers of a newly uploaded image once the book is committed.
+    """
+    image_name = instance.image.name
+    if (not image_name or has_derivatives(image_name)
+            or not instance.image.storage.exists(image_name)):
+        return
+
+    def build():
+        try:
+            generate_derivatives(image_name)
+        except OSError:
+            logger.exception('Could not generate the derivatives of %s', image_name)
+            return
+        # Cached cards still point at the original image
+        bump_card_version(instance.id)
+
+    transaction.on_commit(build)
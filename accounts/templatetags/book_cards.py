@@ -0,0 +1,15 @@
+"""
+Template tags rendering the book cards of the catalog pages from the fragment cache.
+"""
+from django import template
+from accounts.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def book_cards(books, variant):
+    """
+    Render the cards of ``books`` with the card markup of ``variant``.
+    """
+    return render_cards(books, variant)
@@ -0,0 +1,25 @@
+"""
+Template tags emitting the book cover images with responsive derivatives.
+"""
+from django import template
+from django.utils.html import format_html
+from accounts.images import image_sources
+
+register = template.Library()
+
+
+@register.simple_tag
+def book_image(book, variant, css_class='', style='', alt='Responsive image'):
+    """
+    Render the cover of ``book`` as a lazily loaded ``<picture>`` using the WebP and
+    JPEG derivatives of ``variant``, or the original image if they don't exist yet.
+    """
+    sources = image_sources(book.image.name, variant)
+    if sources is None:
+        return format_html('<img src="{}" class="{}" style="{}" alt="{}" loading="lazy">',
+                           book.image.url if book.image else '', css_class, style, alt)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" class="{}" style="{}" alt="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        sources['webp_srcset'], sources['src'], sources['srcset'], css_class, style, alt)
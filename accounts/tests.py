@@ -1,16 +1,31 @@
 """
 Module for testing the forms.
 """
-import json
 import datetime
+import os
+import shutil
+import tempfile
+from unittest import mock
+from PIL import Image
+from django.core.cache import cache
+from django.http import QueryDict
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.db import IntegrityError
 from django.urls import reverse
 from django.contrib.messages import get_messages
 from cart.cart import Cart
+from cart.models import CartItem
+from .autocomplete import INDEX_VERSION_KEY, complete, load_prefix_index, prefix_index
+from .book_page import load_book_page
+from .cards import bump_version, render_cards
+from .images import generate_derivatives
+from .facets import facet_search
 from .forms import UserInfoForm, UpdateUserForm
 from .models import Profile, Customer, Book, Tag, ProductReviews
+from .pagination import keyset_page
+from .search_index import search_books
+from .templatetags.book_images import book_image
 
 class UserInfoFormTest(TestCase):
     """
@@ -306,8 +321,12 @@ class LoginUserTests(TestCase):
         self.customer = Customer.objects.create(user=self.user,
                                                 phone='1234567890',
                                                 email='olga@gmail.com')
-        self.customer.old_cart = json.dumps({'1': 2, '2': 3})
-        self.customer.save()
+        # Save a cart of two books for the user
+        self.books = [Book.objects.create(title=title, image='uploads/books/book.png')
+                      for title in ('Dune', 'Emma')]
+        CartItem.objects.bulk_create([CartItem(user=self.user, book=book, quantity=quantity)
+                                      for book, quantity in zip(self.books, (2, 3))])
+        self.saved_cart = {str(self.books[0].id): 2, str(self.books[1].id): 3}
 
     def test_login_valid_user(self):
         """
@@ -362,9 +381,423 @@ class LoginUserTests(TestCase):
         # Check if the user is redirected to the home page after login
         self.assertRedirects(response, reverse('home'))
 
-        self.client.session['session_key'] = {'1': 2, '2': 3}
-        self.client.session.save()
-
         # Check if the cart items were added correctly in the Cart
         cart = Cart(self.client)
-        self.assertEqual(cart.get_quants(), {'1': 2, '2': 3})
+        self.assertEqual(cart.get_quants(), self.saved_cart)
+
+class CatalogPaginationTests(TestCase):
+    """
+    Test case for the keyset paginated catalog listings.
+    """
+    def setUp(self):
+        """
+        Create more books than fit on one page.
+        """
+        for number in range(12):
+            Book.objects.create(title=f'Book {number}', author='Author', price=10,
+                                image='uploads/books/book.png')
+
+    def test_pages_do_not_overlap(self):
+        """
+        Test that following the cursor walks the whole catalog once, in order.
+        """
+        first = self.client.get(reverse('home'))
+        self.assertEqual(len(first.context['books']), 9)
+        self.assertTrue(first.context['page'].has_next)
+
+        cursor = first.context['page'].next_cursor
+        second = self.client.get(reverse('home'), {'cursor': cursor})
+        titles = [book.title for book in first.context['books'] + second.context['books']]
+        self.assertEqual(titles, [f'Book {number}' for number in range(12)])
+        self.assertFalse(second.context['page'].has_next)
+
+    def test_catalog_json(self):
+        """
+        Test that the JSON listing returns the same page and a usable cursor.
+        """
+        response = self.client.get(reverse('catalog_json'))
+        data = response.json()
+        self.assertEqual(len(data['books']), 9)
+        self.assertEqual(data['books'][0]['title'], 'Book 0')
+
+        response = self.client.get(reverse('catalog_json'), {'cursor': data['next_cursor']})
+        self.assertEqual([book['title'] for book in response.json()['books']],
+                         ['Book 9', 'Book 10', 'Book 11'])
+        self.assertIsNone(response.json()['next_cursor'])
+
+    def test_books_without_creation_date(self):
+        """
+        Test that books without a creation date come first and are paged like the others.
+        """
+        undated = [Book.objects.create(title=f'Undated {number}', author='Author', price=10,
+                                       image='uploads/books/book.png') for number in range(9)]
+        Book.objects.filter(id__in=[book.id for book in undated]).update(data_created=None)
+        titles, cursor = [], None
+        while True:
+            page = keyset_page(Book.objects.all(), cursor, per_page=4)
+            titles.extend(book.title for book in page.books)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(titles, [f'Undated {number}' for number in range(9)] +
+                         [f'Book {number}' for number in range(12)])
+
+    def test_invalid_cursor(self):
+        """
+        Test that a tampered cursor is rejected by the JSON listing.
+        """
+        response = self.client.get(reverse('catalog_json'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ComingSoonTests(TestCase):
+    """
+    Test case for the precomputed release calendar on the coming soon page.
+    """
+    def setUp(self):
+        """
+        Create a released book and two upcoming books in different months.
+        """
+        cache.clear()
+        today = datetime.date.today()
+        self.soon = today + datetime.timedelta(days=1)
+        self.later = today + datetime.timedelta(days=70)
+        Book.objects.create(title='Released', publication=today, image='uploads/books/a.png')
+        Book.objects.create(title='Later', publication=self.later, image='uploads/books/b.png')
+        Book.objects.create(title='Soon', publication=self.soon, image='uploads/books/c.png')
+
+    def test_only_upcoming_books_grouped_by_month(self):
+        """
+        Test that only future books are listed, sorted and grouped by release month.
+        """
+        response = self.client.get(reverse('coming_soon'))
+        releases = response.context['releases']
+        self.assertEqual([release['start'] for release in releases],
+                         [self.soon.replace(day=1), self.later.replace(day=1)])
+        self.assertEqual([book.title for release in releases for book in release['books']],
+                         ['Soon', 'Later'])
+
+    def test_calendar_refreshed_when_book_saved(self):
+        """
+        Test that saving a book rebuilds the cached calendar.
+        """
+        self.client.get(reverse('coming_soon'))
+        # Keep the on commit updates away from the recommender artifacts of the project
+        self.enterContext(self.settings(RECOMMENDER_ROOT=self.enterContext(
+            tempfile.TemporaryDirectory())))
+        with mock.patch('accounts.releases.build_release_calendar') as build, \
+                self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='Sooner', publication=self.soon, image='uploads/books/d.png')
+            Book.objects.filter(title='Soon').get().save()
+        # The saves only drop the calendar, the next visit builds it
+        build.assert_not_called()
+
+        response = self.client.get(reverse('coming_soon'), {'group': 'week'})
+        titles = [book.title for release in response.context['releases']
+                  for book in release['books']]
+        self.assertEqual(titles, ['Soon', 'Sooner', 'Later'])
+
+
+class BookCardCacheTests(TestCase):
+    """
+    Test case for the fragment cached book cards.
+    """
+    def setUp(self):
+        """
+        Create a book with a tag.
+        """
+        cache.clear()
+        self.tag = Tag.objects.create(name='Classic')
+        self.book = Book.objects.create(title='Emma', author='Jane Austen', price=10,
+                                        image='uploads/books/emma.png')
+
+    def test_cards_are_reused(self):
+        """
+        Test that a second render of the same card comes from the cache.
+        """
+        first = render_cards([self.book], 'dashboard')
+        with self.assertTemplateNotUsed('accounts/cards/dashboard.html'):
+            second = render_cards([self.book], 'dashboard')
+        self.assertEqual(first, second)
+
+    def test_saved_book_is_rendered_again(self):
+        """
+        Test that changing the price or the tags of a book invalidates its card.
+        """
+        render_cards([self.book], 'dashboard')
+        self.book.price = 12
+        self.book.save()
+        self.assertIn('Price: $12', render_cards([self.book], 'dashboard'))
+
+        with self.assertTemplateUsed('accounts/cards/dashboard.html'):
+            self.book.tags.add(self.tag)
+            render_cards([self.book], 'dashboard')
+
+
+class SearchTests(TestCase):
+    """
+    Test case for the full-text book search.
+    """
+    def setUp(self):
+        """
+        Create books matching the search terms in different fields.
+        """
+        self.tag = Tag.objects.create(name='Space Opera')
+        self.body = Book.objects.create(title='The Three-Body Problem', author='Cixin Liu',
+                                        image='uploads/books/a.png')
+        self.wind = Book.objects.create(title='The Shadow of the Wind', author='Carlos Zafon',
+                                        descreption='A story about a three day search',
+                                        image='uploads/books/b.png')
+
+    def test_results_ranked_by_relevance(self):
+        """
+        Test that a title match ranks above a description match and that prefixes match.
+        """
+        self.assertEqual(search_books('three'), [self.body, self.wind])
+        self.assertEqual(search_books('thr bod'), [self.body])
+        self.assertEqual(search_books('   '), [])
+
+    def test_index_follows_tags(self):
+        """
+        Test that tag names are searchable and kept in sync when tags change.
+        """
+        self.wind.tags.add(self.tag)
+        self.assertEqual(search_books('opera'), [self.wind])
+
+        self.tag.name = 'Gothic'
+        self.tag.save()
+        self.assertEqual(search_books('opera'), [])
+        self.assertEqual(search_books('gothic'), [self.wind])
+
+    def test_search_view(self):
+        """
+        Test that the search page lists the matching books.
+        """
+        response = self.client.post(reverse('search'), {'searched': 'liu'})
+        self.assertEqual(response.context['searched_books'], [self.body])
+
+
+class AutocompleteTests(TestCase):
+    """
+    Test case for the search-as-you-type completions.
+    """
+    def setUp(self):
+        """
+        Create a few books and tags and load the prefix index afresh.
+        """
+        cache.clear()
+        prefix_index.load([], [])
+        Tag.objects.create(name='Fantasy')
+        self.kings = Book.objects.create(title='The Way of Kings', author='Brandon Sanderson')
+        Book.objects.create(title='Fourth Wing', author='Rebecca Yarros')
+        load_prefix_index()
+
+    def test_completions_without_queries(self):
+        """
+        Test that titles, authors and tags are completed from memory, titles first.
+        """
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search_autocomplete'), {'q': 'F'})
+        self.assertEqual([result['text'] for result in response.json()['results']],
+                         ['Fourth Wing', 'Fantasy'])
+
+        texts = [result['text'] for result in complete('kin')]
+        self.assertEqual(texts, ['The Way of Kings'])
+
+    def test_index_follows_signals(self):
+        """
+        Test that saved and deleted books are reflected in the completions once committed.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            Book.objects.create(title='Kindred', author='Octavia Butler')
+            self.kings.delete()
+            self.assertEqual([result['text'] for result in complete('kin')], ['The Way of Kings'])
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(0):
+            self.assertEqual([result['text'] for result in complete('kin')], ['Kindred'])
+        self.assertEqual([result['text'] for result in complete('octavia')], ['Octavia Butler'])
+
+    def test_index_reloaded_after_changes_of_other_workers(self):
+        """
+        Test that an index loaded before another worker's change is loaded again once the
+        shared version is checked.
+        """
+        Tag.objects.filter(name='Fantasy').update(name='Fable')
+        bump_version(INDEX_VERSION_KEY)
+        self.assertEqual([result['text'] for result in complete('fa')], ['Fantasy'])
+        with mock.patch('accounts.autocomplete.INDEX_CHECK_INTERVAL', 0):
+            self.assertEqual([result['text'] for result in complete('fa')], ['Fable'])
+
+
+class FacetedSearchTests(TestCase):
+    """
+    Test case for the facets of the search results.
+    """
+    def setUp(self):
+        """
+        Create books spread over different tags, authors, prices and decades.
+        """
+        self.fantasy = Tag.objects.create(name='Fantasy')
+        self.mystery = Tag.objects.create(name='Mystery')
+        self.kings = Book.objects.create(title='The Way of Kings', author='Brandon Sanderson',
+                                         price=25, publication=datetime.date(2010, 8, 31),
+                                         image='uploads/books/a.png')
+        self.wind = Book.objects.create(title='The Shadow of the Wind', author='Carlos Zafon',
+                                        price=15, publication=datetime.date(2001, 4, 1),
+                                        image='uploads/books/b.png')
+        self.mistborn = Book.objects.create(title='The Final Empire', author='Brandon Sanderson',
+                                            price=12, publication=datetime.date(2006, 7, 17),
+                                            image='uploads/books/c.png')
+        self.kings.tags.add(self.fantasy)
+        self.mistborn.tags.add(self.fantasy)
+        self.wind.tags.add(self.fantasy, self.mystery)
+
+    def facet_counts(self, response, name):
+        """
+        Helper returning the counts of one facet as a dict.
+        """
+        return {facet['label']: facet['count'] for facet in response.context['facets'][name]}
+
+    def test_facet_counts(self):
+        """
+        Test that all facets are counted over the results.
+        """
+        book_ids = [self.kings.id, self.wind.id, self.mistborn.id]
+        with self.assertNumQueries(1):
+            facet_search(book_ids, QueryDict('searched=the'))
+
+        response = self.client.post(reverse('search'), {'searched': 'the'})
+        self.assertEqual(response.context['total'], 3)
+        self.assertEqual(self.facet_counts(response, 'tag'), {'Fantasy': 3, 'Mystery': 1})
+        self.assertEqual(self.facet_counts(response, 'author'),
+                         {'Brandon Sanderson': 2, 'Carlos Zafon': 1})
+        self.assertEqual(self.facet_counts(response, 'price'), {'$10 - $20': 2, '$20 - $30': 1})
+        self.assertEqual(self.facet_counts(response, 'decade'), {'2000s': 2, '2010s': 1})
+
+    def test_combined_filters(self):
+        """
+        Test that filters of different facets are combined.
+        """
+        response = self.client.get(reverse('search'), {'searched': 'the',
+                                                        'author': 'Brandon Sanderson',
+                                                        'price': '10-20'})
+        self.assertEqual(response.context['searched_books'], [self.mistborn])
+        self.assertEqual(self.facet_counts(response, 'decade'), {'2000s': 1})
+
+    def test_invalid_filter_values_ignored(self):
+        """
+        Test that unknown prices and decades from the query string are ignored.
+        """
+        for params in ({'price': 'cheap'}, {'decade': 'x'}, {'decade': ''},
+                       {'price': '10-', 'decade': '-1990'}):
+            response = self.client.get(reverse('search'), {'searched': 'the', **params})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['total'], 3)
+            self.assertEqual(self.facet_counts(response, 'decade'), {'2000s': 2, '2010s': 1})
+
+    def test_capped_matches_and_selected_tag_names(self):
+        """
+        Test that searches with more matches than are counted are shown as a lower bound,
+        and that selected tags no match has keep their name.
+        """
+        with mock.patch('accounts.views.FACET_LIMIT', 2):
+            response = self.client.get(reverse('search'), {'searched': 'the'})
+        self.assertEqual(response.context['total'], 2)
+        self.assertTrue(response.context['capped'])
+        self.assertContains(response, '2+ results')
+
+        horror = Tag.objects.create(name='Horror')
+        response = self.client.get(reverse('search'), {'searched': 'the', 'tag': str(horror.id)})
+        self.assertFalse(response.context['capped'])
+        self.assertEqual(self.facet_counts(response, 'tag'), {'Horror': 0})
+
+
+class BookPageTests(TestCase):
+    """
+    Test case for the query-optimized and cached book details page.
+    """
+    def setUp(self):
+        """
+        Create a tagged book with more reviews than fit on one page.
+        """
+        cache.clear()
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert',
+                                        image='uploads/books/dune.png')
+        self.book.tags.add(Tag.objects.create(name='Sci-fi'))
+        for number in range(12):
+            user = User.objects.create(username=f'reader{number}')
+            ProductReviews.objects.create(book=self.book, user=user, stars=4,
+                                          content=f'Review {number}')
+
+    def test_fixed_number_of_queries(self):
+        """
+        Test that the book, tags and a page of reviews with their authors take four queries.
+        """
+        with self.assertNumQueries(4):
+            context = load_book_page(self.book.id, 1)
+            [review.user.username for review in context['reviews']]
+            [tag.name for tag in context['book'].tags.all()]
+        self.assertEqual(len(context['reviews']), 10)
+        self.assertEqual(context['reviews'][0].content, 'Review 11')
+
+    def test_anonymous_page_is_cached_until_reviews_change(self):
+        """
+        Test that anonymous visitors are served the cached details until a review changes.
+        """
+        self.client.get(reverse('book', args=[self.book.id]))
+        with self.assertTemplateNotUsed('accounts/book_detail.html'):
+            response = self.client.get(reverse('book', args=[self.book.id]))
+        self.assertContains(response, 'Review 11')
+
+        ProductReviews.objects.filter(content='Review 11').get().delete()
+        response = self.client.get(reverse('book', args=[self.book.id]))
+        self.assertNotContains(response, 'Review 11')
+
+    def test_missing_book(self):
+        """
+        Test that an unknown book is a 404.
+        """
+        response = self.client.get(reverse('book', args=[9999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ImageDerivativeTests(TestCase):
+    """
+    Test case for the resized cover image derivatives.
+    """
+    def setUp(self):
+        """
+        Write a large cover image into a temporary media root.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.makedirs(os.path.join(self.media_root, 'uploads'))
+        Image.new('RGBA', (1200, 1800), 'red').save(
+            os.path.join(self.media_root, 'uploads', 'cover.png'))
+
+    def test_generate_derivatives(self):
+        """
+        Test that card and detail derivatives are written at 1x and 2x, in JPEG and WebP.
+        """
+        with self.settings(MEDIA_ROOT=self.media_root):
+            names = generate_derivatives('uploads/cover.png')
+            self.assertEqual(len(names), 8)
+            with Image.open(os.path.join(self.media_root, 'derivatives/uploads/cover_card@2x.webp')) as card:
+                self.assertEqual(card.size, (574, 820))
+            with Image.open(os.path.join(self.media_root, 'derivatives/uploads/cover_detail.jpg')) as detail:
+                self.assertEqual(detail.size, (433, 650))
+            # Existing derivatives are not generated again
+            self.assertEqual(generate_derivatives('uploads/cover.png'), [])
+
+    def test_template_uses_derivatives(self):
+        """
+        Test that the cards emit a lazy srcset once the derivatives exist.
+        """
+        book = Book(id=1, title='Dune', image='uploads/cover.png')
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.assertIn('src="/images/uploads/cover.png"', book_image(book, 'card'))
+            generate_derivatives('uploads/cover.png')
+            html = book_image(book, 'card')
+        self.assertIn('srcset="/images/derivatives/uploads/cover_card.webp 1x', html)
+        self.assertIn('loading="lazy"', html)
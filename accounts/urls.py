@@ -6,6 +6,7 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('books/', views.catalog_json, name='catalog_json'),
     path('bestsellers/', views.bestsellers, name='bestsellers'),
     path('coming_soon/', views.coming_soon, name='coming_soon'),
     path('login/', views.login_user, name='login'),
@@ -15,6 +16,9 @@ urlpatterns = [
     path('register/', views.register_user, name='register'),
     path('book/<int:pk>', views.book, name='book'),
     path('search/', views.search, name='search'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
     path('book/<int:pk>/review/', views.book_review, name='book_review'),
     path('recommendations/', views.recommendations_view, name='recommendations'),
+    path('recommendations/session/', views.session_recommendations,
+         name='session_recommendations'),
 ]
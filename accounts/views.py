@@ -1,45 +1,120 @@
 """
 Views for the accounts app.
 """
-import json
-import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse, HttpRequest
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+from django.http import JsonResponse, HttpResponse, HttpRequest, QueryDict
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.db.models import Q
-from cart.cart import Cart
+from cart.cart import Cart, saved_cart
 from payment.forms import ShippingForm
-from payment.models import ShippingAddress
+from payment.models import BestsellerRank, ShippingAddress
+from payment.rankings import top_books
+from recommendations.co_purchases import bought_together
+from recommendations.content_similarity import similar_books
+from recommendations.neighbors import also_liked
+from recommendations.personal import recommended_book_ids
+from recommendations.popularity import popular_books
+from recommendations.session import remember_viewed, session_book_ids
+from .autocomplete import complete
+from .book_page import BOOK_PAGE_TIMEOUT, book_page_cache_key, load_book_page
 from .forms import SignUpForm, UpdateUserForm, UserInfoForm
-from .models import Book, Customer, ProductReviews, Profile
-
+from .models import Book, Customer, ProductReviews, Profile, Tag
+from .pagination import CARD_FIELDS, InvalidCursor, KeysetPage, keyset_page
+from .releases import GROUP_BY_MONTH, GROUP_BY_WEEK, release_calendar
+from .facets import facet_search, parse_filters
+from .search_index import books_in_order, get_search_backend
+
+# Number of books shown on the bestsellers page
+BESTSELLERS_LIMIT = 20
+# Number of completions returned while typing in the search box
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+# Number of search matches the facets are counted over, and how many are shown.
+# Totals and counts of searches with more matches are shown as at least that many.
+FACET_LIMIT = 1000
+SEARCH_LIMIT = 60
+SESSION_RECOMMENDATIONS_LIMIT = 4
+SESSION_RECOMMENDATIONS_MAX_LIMIT = 12
 
 # Create your views here.
 
+def catalog_page(request: HttpRequest, fields=CARD_FIELDS) -> KeysetPage:
+    """
+    Helper for the catalog listings to load the page of books after the
+    ``cursor`` query parameter, only reading the columns the cards need.
+    An unreadable cursor starts again from the first page.
+    """
+    books = Book.objects.only(*fields)
+    try:
+        return keyset_page(books, request.GET.get('cursor'))
+    except InvalidCursor:
+        return keyset_page(books)
+
 def home(request: HttpRequest)-> HttpResponse:
     """
-    Renders the home page, displaying all available books.
+    Renders the home page, displaying one page of the available books.
+    """
+    page = catalog_page(request)
+    return render(request, 'accounts/dashboard.html', {'books':page.books, 'page':page})
+
+def catalog_json(request: HttpRequest) -> JsonResponse:
+    """
+    Returns the same page of books as the home page as JSON, used for infinite scroll.
     """
-    books = Book.objects.all()
-    return render(request, 'accounts/dashboard.html', {'books':books})
+    try:
+        page = keyset_page(Book.objects.only(*CARD_FIELDS), request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    books = [{
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'price': str(book.price),
+        'publication': book.publication.isoformat(),
+        'pages': book.pages,
+        'cover': book.cover,
+        'image': book.image.url if book.image else '',
+        'url': reverse('book', args=[book.id]),
+    } for book in page.books]
+    return JsonResponse({'books': books, 'next_cursor': page.next_cursor})
 
 def bestsellers(request: HttpRequest) -> HttpResponse:
     """
-    Renders the bestsellers page, displaying all bestselling books.
+    Renders the bestsellers page, displaying the top selling books of a window
+    (all time, last 30 or 7 days), optionally for a single tag.
     """
-    books = Book.objects.all()
-    return render(request, 'accounts/bestsellers.html', {'books':books})
+    window = request.GET.get('window', BestsellerRank.ALL_TIME)
+    if window not in dict(BestsellerRank.WINDOWS):
+        window = BestsellerRank.ALL_TIME
+    tag_id = request.GET.get('tag')
+    tag_id = int(tag_id) if tag_id and tag_id.isdigit() else None
+
+    books = top_books(window, tag_id, limit=BESTSELLERS_LIMIT,
+                      fields=CARD_FIELDS + ('descreption',))
+    return render(request, 'accounts/bestsellers.html',
+                  {'books':books,
+                   'windows': BestsellerRank.WINDOWS,
+                   'window': window,
+                   'tags': Tag.objects.all(),
+                   'tag_id': tag_id})
 
 def coming_soon(request: HttpRequest) -> HttpResponse:
     """
-    Renders the coming_soon page, displaying all coming soon books.
+    Renders the coming_soon page, displaying the upcoming books
+    from the precomputed release calendar, grouped by month or by week.
     """
-    books = Book.objects.all()
-    return render(request, 'accounts/coming_soon.html', {'books':books})
+    group_by = request.GET.get('group', GROUP_BY_MONTH)
+    if group_by != GROUP_BY_WEEK:
+        group_by = GROUP_BY_MONTH
+    calendar = release_calendar()
+    return render(request, 'accounts/coming_soon.html',
+                  {'releases': calendar[group_by], 'group_by': group_by})
 
 def login_user(request: HttpRequest) -> HttpResponse:
     """
@@ -56,13 +131,9 @@ def login_user(request: HttpRequest) -> HttpResponse:
             login(request, user)
             print(request.user.id)
 
-            current_user = Customer.objects.get(user__id = request.user.id)
             # Get their saved cart from database
-            saved_cart = current_user.old_cart
-            # Convert database str to dict
-            if saved_cart:
-                # Convert to dict using json
-                converted_cart = json.loads(saved_cart)
+            converted_cart = saved_cart(request.user)
+            if converted_cart:
                 # Add the loaded cart dict to session
                 cart = Cart(request)
                 # Loop through the cart(dict) and add the items from the database
@@ -161,29 +232,94 @@ def update_info(request: HttpRequest) -> HttpResponse:
 
 def book(request: HttpRequest, pk: int) -> HttpResponse:
     """
-     Renders the book details page for a specific book identified by its primary key.
+     Renders the book details page for a specific book identified by its primary key,
+     with one page of its reviews, the books its readers also liked, the books
+     frequently bought with it and the books with similar content.
+     Anonymous visitors get the details from the cache. The book is remembered as recently
+     viewed in the session.
     """
-    book_details = Book.objects.get(id=pk)
-    return render(request, 'accounts/book.html', {'book':book_details})
+    page_number = request.GET.get('page', '')
+    page_number = int(page_number) if page_number.isdigit() else 1
+
+    if request.user.is_authenticated:
+        # The review form is personal, so this version is never cached
+        context = load_book_page(pk, page_number)
+        remember_viewed(request.session, pk)
+        return render(request, 'accounts/book.html',
+                      {'book_id': pk, 'also_liked': also_liked(pk),
+                       'bought_together': bought_together([pk]),
+                       'similar_books': books_in_order(similar_books(pk)), **context})
+
+    cache_key = book_page_cache_key(pk, page_number)
+    book_html = cache.get(cache_key)
+    if book_html is None:
+        book_html = render_to_string('accounts/book_detail.html',
+                                     load_book_page(pk, page_number), request)
+        cache.set(cache_key, book_html, BOOK_PAGE_TIMEOUT)
+    remember_viewed(request.session, pk)
+    return render(request, 'accounts/book.html',
+                  {'book_id': pk, 'book_html': mark_safe(book_html),
+                   'also_liked': also_liked(pk),
+                   'bought_together': bought_together([pk]),
+                   'similar_books': books_in_order(similar_books(pk))})
 
 def search(request: HttpRequest) -> HttpResponse:
     """
     Handles search functionality for books based on the search term entered by the user.
-    User can serach by title or tag
+    User can serach by title, author, description or tag, best matches first,
+    and narrow the results down with the tag, author, price and decade facets.
     """
     if request.method == "POST":
-        searched = request.POST['searched']
-        searched_books = Book.objects.filter(
-            Q(title__icontains=searched) |
-            Q(tags__name__icontains=searched)
-        ).distinct()
-        if not searched_books:
-            return render(request, 'accounts/search.html', {})
-
-        return render(request, 'accounts/search.html',
-                          {'searched':searched, 'searched_books':searched_books})
+        params = QueryDict(mutable=True)
+        params['searched'] = request.POST['searched']
+    else:
+        params = request.GET
+    searched = params.get('searched')
+    if not searched:
+        return render(request, 'accounts/search.html', {})
+
+    # One more match than counted tells whether the matches were cut off
+    book_ids = get_search_backend().search(searched, FACET_LIMIT + 1)
+    capped = len(book_ids) > FACET_LIMIT
+    results = facet_search(book_ids[:FACET_LIMIT], params)
+    searched_books = books_in_order(results.book_ids[:SEARCH_LIMIT])
+    if not searched_books and not parse_filters(params):
+        return render(request, 'accounts/search.html', {})
+
+    return render(request, 'accounts/search.html',
+                      {'searched':searched,
+                       'searched_books':searched_books,
+                       'facets': results.facets,
+                       'total': len(results.book_ids),
+                       'capped': capped})
+
+def search_autocomplete(request: HttpRequest) -> JsonResponse:
+    """
+    Returns the title, author and tag completions of the ``q`` prefix as JSON,
+    served from the in-memory prefix index.
+    """
+    limit = request.GET.get('limit', '')
+    limit = min(int(limit), AUTOCOMPLETE_MAX_LIMIT) if limit.isdigit() else AUTOCOMPLETE_LIMIT
+    return JsonResponse({'results': complete(request.GET.get('q', ''), limit)})
 
-    return render(request, 'accounts/search.html', {})
+def session_recommendations(request: HttpRequest) -> JsonResponse:
+    """
+    Returns as JSON the books recommended from the cart and the recently viewed
+    books of the session, or the popular books when the session has none.
+    """
+    limit = request.GET.get('limit', '')
+    limit = (min(int(limit), SESSION_RECOMMENDATIONS_MAX_LIMIT) if limit.isdigit()
+             else SESSION_RECOMMENDATIONS_LIMIT)
+    book_ids = session_book_ids(request.session, limit)
+    books = books_in_order(book_ids) if book_ids else popular_books(limit)
+    return JsonResponse({'books': [{
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'price': str(book.price),
+        'image': book.image.url if book.image else '',
+        'url': reverse('book', args=[book.id]),
+    } for book in books], 'personal': bool(book_ids)})
 
 def book_review(request: HttpRequest, pk: int) -> JsonResponse:
     """
@@ -226,62 +362,33 @@ def book_review(request: HttpRequest, pk: int) -> JsonResponse:
 def recommendations_view(request: HttpRequest) -> HttpResponse:
     """
     Provides book recommendations for a logged-in user based on collaborative filtering 
-    using ratings data. If the user has not rated any books, generic recommendations are provided.
+    using ratings data. If the user has not rated any books, or there is nothing similar
+    to what they rated, the most popular books are recommended instead, overall or for
+    the ``tag`` given in the query string. Anonymous visitors get the popular books too.
+    The book similarities are precomputed by the ``build_recommendations`` command,
+    and the result is cached per user.
     """
-    if not request.user.is_authenticated:
-        # Redirect and show a message if the user is not authenticated
-        return render(request, 'login.html',
-                      {'message': 'You need to be logged in to view recommendations.'})
-
-    user = request.user  # Get the logged-in user
-
-    # all ratings data for the current user
-    ratings = ProductReviews.objects.filter(user=user)
-
-    if not ratings.exists():
-        # Handle case where the user has no ratings
-        return HttpResponse("No ratings found for this user. Please rate some books first.")
-
-    all_books = Book.objects.all().values_list('id', flat=True)
-    all_ratings = ProductReviews.objects.all()  # Fetch ratings for all users
-    all_users = list(User.objects.all().values_list('username', flat=True))
-
-    ratings_matrix = pd.DataFrame(np.nan, index=all_users, columns=all_books)
+    tag_id = request.GET.get('tag')
+    tag_id = int(tag_id) if tag_id and tag_id.isdigit() else None
+    context = {'tags': Tag.objects.all(), 'tag_id': tag_id}
 
-    # For each rating, we update the corresponding cell in the DataFrame
-    for rating in all_ratings:
-        ratings_matrix.loc[rating.user.username, rating.book.id] = rating.stars
-
-    # Now `ratings_matrix` will have `NaN` for unrated books and actual ratings where applicable
-    ratings_matrix = ratings_matrix.fillna(0)
-
-    # Calculate similarity between books (item-based collaborative filtering)
-    item_similarity = cosine_similarity(ratings_matrix.T)
-
-    # Create a DataFrame for item similarities (book-to-book similarities)
-    item_similarity_df = pd.DataFrame(item_similarity,
-                                      index=ratings_matrix.columns,
-                                      columns=ratings_matrix.columns
-                                    )
+    if not request.user.is_authenticated:
+        return render(request, 'accounts/recommendations.html',
+                      {'recommended_books': popular_books(3, tag_id), 'popular': True,
+                       'message': 'Log in and rate books to get personal recommendations.',
+                       **context})
 
-    # Get the books the user has rated
-    user_ratings = ratings_matrix.loc[user.username]
-    rated_books = user_ratings[user_ratings > 0].index.tolist()
-    #print(f"Books rated by {user.username}: {rated_books}")
+    # Cached until the user rates a book or a new model is built
+    has_ratings, recommended_books_ids = recommended_book_ids(request.user.id, 3)
 
-    if not rated_books:
-    # If the user hasn't rated any books yet,return a generic set of recommendations
-        recommended_books = Book.objects.all()[:3]  # first 3 books
+    if not recommended_books_ids:
+        # Nothing personal yet, recommend what is popular that the user hasn't reviewed
+        message = None if has_ratings else 'Rate some books to get personal recommendations.'
         return render(request, 'accounts/recommendations.html',
-                      {'recommended_books': recommended_books})
-
-    # Get the similarity scores of the rated books
-    similar_scores = item_similarity_df.loc[rated_books].mean(axis=0)
-    # Exclude books the user has already rated
-    similar_scores = similar_scores.drop(rated_books)
-    # Sort and select top 3 book recommendations
-    recommended_books_ids = similar_scores.sort_values(ascending=False).head(3).index.tolist()
-    recommended_books = Book.objects.filter(id__in=recommended_books_ids)
+                      {'recommended_books': popular_books(3, tag_id, request.user),
+                       'popular': True, 'message': message, **context})
+
+    recommended_books = books_in_order(recommended_books_ids)
 
     # Render the recommendations in the template
     return render(request, 'accounts/recommendations.html',
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'accounts',
     'cart',
     'payment',
+    'recommendations',
 ]
 
 MIDDLEWARE = [
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cart.middleware.CartPersistenceMiddleware',
 ]
 
 ROOT_URLCONF = 'book.urls'
@@ -87,6 +89,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# The cached pages and version counters must be shared by every worker
+# process, so the cache lives in Redis when REDIS_URL is set and otherwise in
+# the database table created by ``manage.py createcachetable``.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -130,6 +155,13 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/images/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'static/images')
 
+# Recommender model artifacts
+
+RECOMMENDER_ROOT = os.path.join(BASE_DIR, 'var', 'recommender')
+
+# 'item_similarity', or 'latent_factors' for large rating sets
+RECOMMENDER_ENGINE = 'item_similarity'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -1 +1,7 @@
-# Register your models here.
+"""
+Admin configuration for the cart app.
+"""
+from django.contrib import admin
+from .models import CartItem
+
+admin.site.register(CartItem)
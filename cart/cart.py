@@ -1,7 +1,131 @@
 """
 Manages the shopping cart functionality
 """
-from accounts.models import Book, Customer
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import cached_property
+from django.db import transaction
+from accounts.models import Book
+from .models import CartItem
+
+
+@dataclass
+class CartLine:
+    """
+    A book of the cart with its quantity and the price of that quantity.
+    """
+    book: Book
+    quantity: int
+    total: Decimal
+
+
+class CartSnapshot:
+    """
+    The books of a cart loaded with a single query, indexed by id, with the line
+    totals and the grand total computed in one pass. Books deleted since they were
+    added are left out.
+    """
+    def __init__(self, quantities: dict):
+        books = Book.objects.in_bulk([int(book_id) for book_id in quantities])
+        self.lines = []
+        self.total = Decimal(0)
+        for book_id, quantity in quantities.items():
+            book = books.get(int(book_id))
+            if book is None:
+                continue
+            line = CartLine(book, int(quantity), book.price * int(quantity))
+            self.lines.append(line)
+            self.total += line.total
+        self.by_id = {line.book.id: line for line in self.lines}
+
+    @property
+    def books(self) -> list[Book]:
+        """
+        The books of the cart, in the order they were added.
+        """
+        return [line.book for line in self.lines]
+
+    @property
+    def quantities(self) -> dict[int, int]:
+        """
+        The quantity of every book of the cart by book id.
+        """
+        return {book_id: line.quantity for book_id, line in self.by_id.items()}
+
+    def __len__(self):
+        return len(self.lines)
+
+
+# Operations accepted in one batch of cart changes, and the most of them
+CART_OPERATIONS = ('add', 'update', 'remove')
+MAX_OPERATIONS = 100
+
+
+class InvalidOperation(ValueError):
+    """
+    Raised when a batch of cart changes sent by the client is not valid.
+    """
+
+
+def parse_operations(operations) -> list[tuple[str, int, int]]:
+    """
+    Validates a list of {"op", "book_id", "quantity"} changes, checking all the
+    added and updated books exist with a single query, and returns them as
+    (op, book id, quantity). Books deleted from the shop can still be removed.
+    """
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_OPERATIONS:
+        raise InvalidOperation(f'Send from 1 to {MAX_OPERATIONS} operations')
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in CART_OPERATIONS:
+            raise InvalidOperation(f'Operations must be one of {", ".join(CART_OPERATIONS)}')
+        try:
+            book_id, quantity = int(operation['book_id']), int(operation.get('quantity', 1))
+        except (KeyError, TypeError, ValueError) as error:
+            raise InvalidOperation('Invalid book or quantity') from error
+        if quantity < 1:
+            raise InvalidOperation('Invalid book or quantity')
+        parsed.append((operation['op'], book_id, quantity))
+
+    book_ids = {book_id for operation, book_id, _ in parsed if operation != 'remove'}
+    missing = book_ids - set(Book.objects.filter(id__in=book_ids).values_list('id', flat=True))
+    if missing:
+        raise InvalidOperation(f'Unknown books: {", ".join(map(str, sorted(missing)))}')
+    return parsed
+
+def cart_count(request) -> int:
+    """
+    Number of books in the cart of a request, without loading the session of
+    visitors who don't have one yet.
+    """
+    if request.session.session_key is None:
+        return 0
+    return len(request.session.get('session_key', {}))
+
+
+def save_cart(user, cart: dict):
+    """
+    Saves the cart of a logged-in user so it is restored when they log in again.
+    The quantities are upserted in one query and the books no longer in the cart
+    are removed, leaving out the books deleted from the shop.
+    """
+    quantities = {int(book_id): int(quantity) for book_id, quantity in cart.items()}
+    books = Book.objects.filter(id__in=quantities).values_list('id', flat=True)
+    with transaction.atomic():
+        CartItem.objects.filter(user_id=user.id).exclude(book_id__in=quantities).delete()
+        CartItem.objects.bulk_create(
+            [CartItem(user_id=user.id, book_id=book_id, quantity=quantities[book_id])
+             for book_id in books],
+            update_conflicts=True, unique_fields=['user', 'book'], update_fields=['quantity'])
+
+def saved_cart(user) -> dict[str, int]:
+    """
+    The saved cart of a user, in the format of the session cart.
+    """
+    return {str(book_id): quantity for book_id, quantity in
+            CartItem.objects.filter(user_id=user.id).order_by('added_at', 'id')
+            .values_list('book_id', 'quantity')}
+
 
 class Cart():
     """
@@ -14,19 +138,31 @@ class Cart():
         """
         self.session = request.session
         self.request = request
-        # Get the current session key if it exists
-        cart = self.session.get('session_key')
+        # Get the current session key if it exists. A new visitor's cart is only
+        # stored in the session once something is put in it.
+        self.cart = self.session.get('session_key', {})
 
-        # If the user is new, no session key. Create one.
-        if 'session_key' not in request.session:
-            cart = self.session['session_key'] = {}
+    @cached_property
+    def snapshot(self) -> CartSnapshot:
+        """
+        The books, quantities and totals of the cart, loaded once and reused for
+        everything the request renders or writes until the cart changes.
+        """
+        return CartSnapshot(self.cart)
 
-        # Make sure cart is available on all pages of the site
-        self.cart = cart
+    def _changed(self):
+        """
+        Stores the cart in the session, forgets the snapshot of the old cart and
+        marks the cart to be saved for the user at the end of the request.
+        """
+        self.session['session_key'] = self.cart
+        self.session.modified = True
+        self.request.cart_changed = True
+        self.__dict__.pop('snapshot', None)
 
     def add(self, book, quantity, db_add=False):
         """
-        Adds a book to the cart. Saves cart data for logged-in users.
+        Adds a book to the cart.
         """
         if db_add:
             book_id = str(book)
@@ -37,17 +173,7 @@ class Cart():
         if book_id not in self.cart:
             self.cart[book_id] = int(book_qty)
 
-        self.session.modified = True
-
-        # Deal with logged in user:
-        if self.request.user.is_authenticated:
-            # Get the current user profile
-            current_user = Customer.objects.filter(user__id = self.request.user.id)
-            # Convert { '3': 1, '2': 2} to {"3": 1, "2": 2} bc json from str to dict
-            carty = str(self.cart)
-            carty = carty.replace("\'", "\"")
-            # Save our carty to the customer model
-            current_user.update(old_cart=str(carty))
+        self._changed()
 
     def __len__(self):
         """
@@ -59,12 +185,7 @@ class Cart():
         """
          Returns the books currently in the cart.
         """
-        # Get ids from cart
-        books_ids = self.cart.keys()
-        # Use ids to lookup products in the DB model
-        books = Book.objects.filter(id__in=books_ids)
-        # Return those looked up products
-        return books
+        return self.snapshot.books
 
     def get_quants(self):
         """
@@ -89,14 +210,7 @@ class Cart():
         ourcart = self.cart
         ourcart[book_id] = book_qty
 
-        self.session.modified = True
-
-        # for the change in old_cart in our admin when we update the book/s
-        current_user = Customer.objects.filter(user__id = self.request.user.id)
-        carty = str(self.cart)
-        carty = carty.replace("\'", "\"")
-        # Save our carty to the customer model
-        current_user.update(old_cart=str(carty))
+        self._changed()
 
         thing = self.cart
         return thing
@@ -110,31 +224,24 @@ class Cart():
         if book_id in self.cart:
             del self.cart[book_id]
 
-        # for the change in old_cart in our admin when we delete the book/s
-        current_user = Customer.objects.filter(user__id = self.request.user.id)
-        carty = str(self.cart)
-        carty = carty.replace("\'", "\"")
-        # Save our carty to the customer model
-        current_user.update(old_cart=str(carty))
+        self._changed()
 
-        self.session.modified = True
+    def apply(self, operations: list[tuple[str, int, int]]):
+        """
+        Applies a batch of validated changes, see parse_operations, in order.
+        Adding a book already in the cart adds to its quantity.
+        """
+        for operation, book_id, quantity in operations:
+            if operation == 'add':
+                quantity += int(self.cart.get(str(book_id), 0))
+                self.update(book=book_id, quantity=quantity)
+            elif operation == 'update':
+                self.update(book=book_id, quantity=quantity)
+            else:
+                self.delete(book=book_id)
 
     def cart_total(self):
         """
         Calculates the total price of items in the cart.
         """
-        # Get books IDs
-        book_ids = self.cart.keys()
-        # Lookup those keys in our book database model
-        books = Book.objects.filter(id__in=book_ids)
-        # Get quantities
-        quantities = self.cart
-        total = 0
-
-        for key, value in quantities.items():
-            #{'4':3, '2':1}
-            key = int(key)
-            for book in books:
-                if book.id == key:
-                    total = total + (book.price * value)
-        return total
+        return self.snapshot.total
@@ -1,10 +1,14 @@
 """
 Create context processor so our cart can work on all pages of the site
 """
-from .cart import Cart
+from functools import partial
+from django.utils.functional import SimpleLazyObject
+from .cart import Cart, cart_count
 
 def cart(request):
     """
-    Return the default data from our Cart
+    Return the default data from our Cart. Both are lazy, so the session is
+    only read by the templates that use them, and only once.
     """
-    return {'cart': Cart(request)}
+    return {'cart': SimpleLazyObject(partial(Cart, request)),
+            'cart_count': SimpleLazyObject(partial(cart_count, request))}
@@ -0,0 +1,27 @@
+"""
+Middleware saving the carts of logged-in users
+"""
+import logging
+from django.db import DatabaseError
+from .cart import save_cart
+
+logger = logging.getLogger(__name__)
+
+class CartPersistenceMiddleware:
+    """
+    Saves the cart of a logged-in user once at the end of a request that changed it,
+    however many books were added, updated or removed during the request. Failed
+    requests don't save anything, and a failed save doesn't fail the response.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (getattr(request, 'cart_changed', False) and response.status_code < 400
+                and request.user.is_authenticated):
+            try:
+                save_cart(request.user, request.session.get('session_key', {}))
+            except DatabaseError:
+                logger.exception('Could not save the cart of user %s', request.user.id)
+        return response
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:40
+"""
+Module for 2 migration
+"""
+import json
+from django.db import migrations
+
+
+def copy_old_carts(apps, schema_editor):
+    """
+    Move the saved carts of Customer.old_cart into cart items, skipping the
+    carts truncated into invalid JSON and the books deleted since
+    """
+    Customer = apps.get_model('accounts', 'Customer')
+    Book = apps.get_model('accounts', 'Book')
+    CartItem = apps.get_model('cart', 'CartItem')
+    items = []
+    for user_id, old_cart in Customer.objects.exclude(old_cart=None).exclude(old_cart='') \
+            .values_list('user_id', 'old_cart').iterator():
+        try:
+            saved = json.loads(old_cart)
+        except ValueError:
+            continue
+        if not isinstance(saved, dict):
+            continue
+        for book_id, quantity in saved.items():
+            try:
+                items.append(CartItem(user_id=user_id, book_id=int(book_id),
+                                      quantity=max(int(quantity), 1)))
+            except (TypeError, ValueError):
+                continue
+    books = set(Book.objects.filter(id__in={item.book_id for item in items})
+                .values_list('id', flat=True))
+    CartItem.objects.bulk_create([item for item in items if item.book_id in books],
+                                 batch_size=1000, ignore_conflicts=True)
+    Customer.objects.exclude(old_cart=None).update(old_cart='')
+
+
+def restore_old_carts(apps, schema_editor):
+    """
+    Write the cart items back into Customer.old_cart
+    """
+    Customer = apps.get_model('accounts', 'Customer')
+    CartItem = apps.get_model('cart', 'CartItem')
+    carts = {}
+    for user_id, book_id, quantity in CartItem.objects.order_by('added_at', 'id') \
+            .values_list('user_id', 'book_id', 'quantity').iterator():
+        carts.setdefault(user_id, {})[str(book_id)] = quantity
+    for user_id, cart in carts.items():
+        Customer.objects.filter(user_id=user_id).update(old_cart=json.dumps(cart))
+
+
+class Migration(migrations.Migration):
+    """
+    Second migration
+    """
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_old_carts, restore_old_carts),
+    ]
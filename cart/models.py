@@ -1 +1,30 @@
-# Create your models here.
+"""
+This module contains the models of the cart app.
+"""
+from django.contrib.auth.models import User
+from django.db import models
+from accounts.models import Book
+
+
+class CartItem(models.Model):
+    """
+    A book in the saved cart of a user.
+
+    The cart of a logged-in user is kept here between sessions, one row per
+    book, and restored into the session cart when they log in again.
+    """
+    user = models.ForeignKey(User, related_name='cart_items', on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, related_name='+', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """
+        One row per user and book
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name='cart_item_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.book} x {self.quantity}'
@@ -1 +1,276 @@
-# Create your tests here.
+"""
+Module for testing the cart app.
+"""
+import json
+from importlib import import_module
+from unittest import mock
+from decimal import Decimal
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from accounts.models import Book, Customer
+from .cart import Cart
+from .models import CartItem
+
+
+class CartSnapshotTests(TestCase):
+    """
+    Test case for the cart snapshot shared by the cart and checkout pages.
+    """
+    def setUp(self):
+        """
+        Create two books and a guest request with both of them in the cart.
+        """
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', price='20.50',
+                                        image='uploads/books/dune.png')
+        self.emma = Book.objects.create(title='Emma', author='Jane Austen', price=10,
+                                        image='uploads/books/emma.png')
+        self.request = RequestFactory().get('/')
+        self.request.session = SessionStore()
+        self.request.user = AnonymousUser()
+        self.request.session['session_key'] = {str(self.emma.id): 3, str(self.dune.id): 2}
+
+    def test_snapshot_loads_the_books_once(self):
+        """
+        Test that the lines and totals are computed from a single query, in cart order.
+        """
+        cart = Cart(self.request)
+        with self.assertNumQueries(1):
+            snapshot = cart.snapshot
+            self.assertEqual(cart.get_books(), [self.emma, self.dune])
+            self.assertEqual(cart.cart_total(), Decimal('71.00'))
+        self.assertEqual([(line.book.title, line.quantity, line.total) for line in snapshot.lines],
+                         [('Emma', 3, Decimal('30')), ('Dune', 2, Decimal('41.00'))])
+        self.assertEqual(snapshot.quantities, {self.emma.id: 3, self.dune.id: 2})
+
+    def test_snapshot_skips_deleted_books_and_follows_changes(self):
+        """
+        Test that deleted books are left out and that a changed cart is loaded again.
+        """
+        emma_id = self.emma.id
+        self.emma.delete()
+        cart = Cart(self.request)
+        self.assertEqual(cart.snapshot.books, [self.dune])
+        self.assertEqual(cart.snapshot.total, Decimal('41.00'))
+
+        cart.update(book=self.dune.id, quantity=1)
+        cart.delete(book=emma_id)
+        self.assertEqual(cart.cart_total(), Decimal('20.50'))
+
+    def test_cart_summary_queries_do_not_grow_with_the_cart(self):
+        """
+        Test that the cart page costs the same number of queries for one book or many.
+        """
+        session = self.client.session
+        session['session_key'] = {str(self.dune.id): 1}
+        session.save()
+        with CaptureQueriesContext(connection) as one_book:
+            self.client.get(reverse('cart_summary'))
+
+        more = [Book.objects.create(title=f'Book {number}', author='Anon', price=5,
+                                    image='uploads/books/book.png') for number in range(5)]
+        session['session_key'] = {str(book.id): 1 for book in [self.dune, *more]}
+        session.save()
+        with self.assertNumQueries(len(one_book)):
+            response = self.client.get(reverse('cart_summary'))
+        self.assertEqual(response.context['totals'], Decimal('45.50'))
+
+
+class CartContextTests(TestCase):
+    """
+    Test case for the lazy cart of the templates.
+    """
+    def test_browsing_does_not_create_a_session(self):
+        """
+        Test that pages rendered for a visitor without a cart don't store a session.
+        """
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'id="cart_quantity">0<')
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_navbar_counts_the_cart(self):
+        """
+        Test that the navbar shows the number of books of the cart.
+        """
+        session = self.client.session
+        session['session_key'] = {'1': 2, '2': 1}
+        session.save()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'id="cart_quantity">2<')
+
+
+class CartPersistenceTests(TestCase):
+    """
+    Test case for saving the carts of logged-in users at the end of the request.
+    """
+    def setUp(self):
+        """
+        Create a user with a saved cart of three books.
+        """
+        self.books = [Book.objects.create(title=f'Book {number}', author='Anon', price=5,
+                                          image='uploads/books/book.png') for number in range(4)]
+        self.user = User.objects.create_user(username='Olga', password='password123')
+        CartItem.objects.bulk_create([CartItem(user=self.user, book=book, quantity=1)
+                                      for book in self.books[:3]])
+
+    def saved(self):
+        """
+        The saved cart of the user by book id.
+        """
+        return dict(CartItem.objects.filter(user=self.user).values_list('book_id', 'quantity'))
+
+    def test_login_merges_the_carts_with_one_write(self):
+        """
+        Test that logging in merges the guest cart into the saved one with a single upsert.
+        """
+        session = self.client.session
+        session['session_key'] = {str(self.books[0].id): 5, str(self.books[3].id): 2}
+        session.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('login'), {'username': 'Olga', 'password': 'password123'})
+        writes = [query['sql'] for query in queries.captured_queries
+                  if query['sql'].startswith(('INSERT INTO "cart_cartitem"', 'UPDATE "cart'))]
+        self.assertEqual(len(writes), 1)
+        expected = {self.books[0].id: 5, self.books[1].id: 1, self.books[2].id: 1,
+                    self.books[3].id: 2}
+        self.assertEqual(self.client.session['session_key'],
+                         {str(book_id): quantity for book_id, quantity in expected.items()})
+        self.assertEqual(self.saved(), expected)
+
+    def test_changes_saved_for_users_only(self):
+        """
+        Test that a changed cart replaces the saved cart of the user, and not for guests.
+        """
+        self.client.force_login(self.user)
+        self.client.post(reverse('cart_add'), {'action': 'post', 'book_id': self.books[3].id,
+                                               'book_qty': 2})
+        self.client.post(reverse('cart_update'), {'action': 'post', 'book_id': self.books[3].id,
+                                                  'book_qty': 4})
+        self.assertEqual(self.saved(), {self.books[3].id: 4})
+
+        self.client.logout()
+        self.client.post(reverse('cart_delete'), {'action': 'post', 'book_id': self.books[3].id})
+        self.assertEqual(self.saved(), {self.books[3].id: 4})
+
+    def test_invalid_quantity_not_saved(self):
+        """
+        Test that a negative quantity is rejected and never reaches the saved cart.
+        """
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('cart_update'), {'action': 'post',
+                                                             'book_id': self.books[0].id,
+                                                             'book_qty': -3})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.saved(), {book.id: 1 for book in self.books[:3]})
+
+    def test_failed_save_does_not_fail_the_request(self):
+        """
+        Test that an error saving the cart is logged instead of turning the response into a 500.
+        """
+        self.client.force_login(self.user)
+        with mock.patch('cart.middleware.save_cart', side_effect=DatabaseError), \
+                self.assertLogs('cart.middleware', 'ERROR'):
+            response = self.client.post(reverse('cart_update'), {'action': 'post',
+                                                                 'book_id': self.books[0].id,
+                                                                 'book_qty': 2})
+        self.assertEqual(response.status_code, 200)
+
+    def test_old_carts_migrated(self):
+        """
+        Test that the saved carts of Customer.old_cart are copied, skipping the broken ones.
+        """
+        other = User.objects.create_user(username='Emma', password='password123')
+        Customer.objects.create(user=other, old_cart=json.dumps(
+            {str(self.books[0].id): 2, str(self.books[1].id): 1, '999999': 1}))
+        truncated = User.objects.create_user(username='Anna', password='password123')
+        Customer.objects.create(user=truncated, old_cart='{"1": 1, "2')
+
+        migration = import_module('cart.migrations.0002_cart_items_from_old_cart')
+        migration.copy_old_carts(django_apps, None)
+        self.assertEqual(dict(other.cart_items.values_list('book_id', 'quantity')),
+                         {self.books[0].id: 2, self.books[1].id: 1})
+        self.assertFalse(truncated.cart_items.exists())
+        self.assertEqual(Customer.objects.get(user=other).old_cart, '')
+
+
+class CartBatchTests(TestCase):
+    """
+    Test case for the endpoint applying several cart changes at once.
+    """
+    def setUp(self):
+        """
+        Create three books, two of them in the cart.
+        """
+        self.books = [Book.objects.create(title=f'Book {number}', author='Anon', price=5,
+                                          image='uploads/books/book.png') for number in range(3)]
+        session = self.client.session
+        session['session_key'] = {str(self.books[0].id): 1, str(self.books[1].id): 1}
+        session.save()
+
+    def post(self, operations):
+        """
+        Send a batch of operations to the endpoint.
+        """
+        return self.client.post(reverse('cart_batch'), json.dumps({'operations': operations}),
+                                content_type='application/json')
+
+    def test_operations_applied_in_one_request(self):
+        """
+        Test that the operations are applied and the new cart is returned.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([
+                {'op': 'add', 'book_id': self.books[2].id, 'quantity': 2},
+                {'op': 'update', 'book_id': self.books[0].id, 'quantity': 3},
+                {'op': 'remove', 'book_id': self.books[1].id},
+            ])
+        # One query to check the books exist and one to load the new cart
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if 'FROM "accounts_book"' in query['sql']]), 2)
+        self.assertEqual(response.json(), {
+            'count': 2,
+            'lines': [
+                {'book_id': self.books[0].id, 'title': 'Book 0', 'price': '5.00',
+                 'quantity': 3, 'total': '15.00'},
+                {'book_id': self.books[2].id, 'title': 'Book 2', 'price': '5.00',
+                 'quantity': 2, 'total': '10.00'},
+            ],
+            'total': '25.00',
+        })
+
+    def test_add_increments_and_deleted_books_can_be_removed(self):
+        """
+        Test that adding a book of the cart adds to its quantity, and that a book
+        deleted from the shop can still be taken out of the cart.
+        """
+        deleted_id = self.books[1].id
+        self.books[1].delete()
+        response = self.post([
+            {'op': 'add', 'book_id': self.books[0].id, 'quantity': 2},
+            {'op': 'remove', 'book_id': deleted_id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(line['book_id'], line['quantity']) for line in response.json()['lines']],
+                         [(self.books[0].id, 3)])
+        self.assertEqual(self.client.session['session_key'], {str(self.books[0].id): 3})
+
+    def test_invalid_batch_changes_nothing(self):
+        """
+        Test that one unknown book or invalid operation rejects the whole batch.
+        """
+        for operations in ([{'op': 'update', 'book_id': self.books[0].id, 'quantity': 3},
+                            {'op': 'add', 'book_id': 999999}],
+                           [{'op': 'remove', 'book_id': self.books[0].id},
+                            {'op': 'clear', 'book_id': self.books[1].id}],
+                           [{'op': 'update', 'book_id': self.books[0].id, 'quantity': 0}],
+                           []):
+            response = self.post(operations)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        self.assertEqual(self.client.session['session_key'],
+                         {str(self.books[0].id): 1, str(self.books[1].id): 1})
@@ -2,27 +2,35 @@
 The module includes functionality for displaying the cart summary, adding/removing books, 
 and updating the cart quantities.
 """
+import json
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from django.db.models import prefetch_related_objects
 from accounts.models import Book
-from .cart import Cart
+from accounts.search_index import books_in_order
+from recommendations.co_purchases import bought_together
+from recommendations.session import session_book_ids
+from .cart import Cart, InvalidOperation, parse_operations
 
 # Create your views here.
 
 def cart_summary(request: HttpRequest) -> HttpResponse:
     """
-    Displays the cart summary page with the books in the cart, their quantities, and total price.
+    Displays the cart summary page with the books in the cart, their quantities, and total price,
+    the books frequently bought together with them and the books similar to the ones
+    in the cart or recently viewed.
     """
     # Get the cart
     cart = Cart(request)
-    cart_books = cart.get_books
-    quantities = cart.get_quants
-    totals = cart.cart_total()
+    snapshot = cart.snapshot
+    # The tags of every book of the cart in one more query
+    prefetch_related_objects(snapshot.books, 'tags')
     return render(request, "cart_summary.html",
-                  {'cart_books': cart_books,
-                   "quantities": quantities,
-                   "totals":totals}
+                  {'cart_lines': snapshot.lines,
+                   "totals": snapshot.total,
+                   "bought_together": bought_together(cart.cart),
+                   "you_may_like": books_in_order(session_book_ids(request.session))}
                 )
 
 def cart_add(request: HttpRequest) -> JsonResponse:
@@ -36,6 +44,8 @@ def cart_add(request: HttpRequest) -> JsonResponse:
         # Get stuff
         book_id = int(request.POST.get('book_id'))
         book_qty = int(request.POST.get('book_qty'))
+        if book_qty < 1:
+            return JsonResponse({'error': 'Invalid quantity'}, status=400)
         # lookup book in DB
         book = get_object_or_404(Book, id=book_id)
         # Save to session
@@ -79,6 +89,8 @@ def cart_update(request: HttpRequest) -> JsonResponse:
         # Get stuff
         book_id = int(request.POST.get('book_id'))
         book_qty = int(request.POST.get('book_qty'))
+        if book_qty < 1:
+            return JsonResponse({'error': 'Invalid quantity'}, status=400)
 
         cart.update(book=book_id, quantity=book_qty)
 
@@ -87,3 +99,31 @@ def cart_update(request: HttpRequest) -> JsonResponse:
         return response
 
     return redirect('home')
+
+def cart_batch(request: HttpRequest) -> JsonResponse:
+    """
+    Applies a JSON list of add, update and remove operations to the cart, all of
+    them or none, and returns the new cart with its line totals and total.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    try:
+        operations = parse_operations(json.loads(request.body).get('operations'))
+    except (ValueError, AttributeError) as error:
+        message = str(error) if isinstance(error, InvalidOperation) else 'Invalid JSON'
+        return JsonResponse({'error': message}, status=400)
+
+    cart = Cart(request)
+    cart.apply(operations)
+    snapshot = cart.snapshot
+    return JsonResponse({
+        'count': len(cart),
+        'lines': [{
+            'book_id': line.book.id,
+            'title': line.book.title,
+            'price': str(line.book.price),
+            'quantity': line.quantity,
+            'total': str(line.total),
+        } for line in snapshot.lines],
+        'total': str(snapshot.total),
+    })
@@ -2,11 +2,13 @@
 Register the model on the admin section thing
 """
 from django.contrib import admin
-from .models import ShippingAddress, Order, OrderItem
+from .models import ShippingAddress, Order, OrderItem, BestsellerRank, BookDailySales
 
 admin.site.register(ShippingAddress)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(BestsellerRank)
+admin.site.register(BookDailySales)
 
 
 class OrderItemInline(admin.StackedInline):
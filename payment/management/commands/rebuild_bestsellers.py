@@ -0,0 +1,32 @@
+"""
+Management command that rebuilds the materialized bestseller rankings.
+"""
+from django.core.management.base import BaseCommand
+from payment.models import BestsellerRank
+from payment.rankings import WINDOW_DAYS, rebuild_rankings, refresh_window
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the bestseller rankings from the order history.
+
+    With ``--windows`` only the rolling windows are recomputed from the daily
+    sales, which is what a daily cron job needs to drop expired days.
+    """
+    help = 'Rebuild the bestseller rankings from the order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--windows', action='store_true',
+                            help='Only refresh the rolling 7 and 30 day windows')
+
+    def handle(self, *args, **options):
+        if options['windows']:
+            for window in WINDOW_DAYS:
+                refresh_window(window)
+            self.stdout.write(self.style.SUCCESS('Rolling bestseller windows refreshed'))
+            return
+
+        rebuild_rankings()
+        count = BestsellerRank.objects.filter(window=BestsellerRank.ALL_TIME,
+                                              tag__isnull=True).count()
+        self.stdout.write(self.style.SUCCESS(f'Bestseller rankings rebuilt for {count} books'))
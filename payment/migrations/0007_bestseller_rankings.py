@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:10
+"""
+Module for 7 migration
+"""
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    7 migration
+    """
+    dependencies = [
+        ('accounts', '0026_book_created_id_idx'),
+        ('payment', '0006_order_date_shipped'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BestsellerRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('all', 'All time'), ('30d', 'Last 30 days'), ('7d', 'Last 7 days')], default='all', max_length=3)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bestseller_ranks', to='accounts.book')),
+                ('tag', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', 'tag', '-units', 'book'], name='bestseller_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('window', 'tag', 'book'), name='bestseller_unique_tag_book'), models.UniqueConstraint(condition=models.Q(('tag__isnull', True)), fields=('window', 'book'), name='bestseller_unique_book')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='accounts.book')),
+            ],
+            options={
+                'verbose_name_plural': 'Book Daily Sales',
+                'unique_together': {('book', 'day')},
+            },
+        ),
+    ]
@@ -6,7 +6,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from accounts.models import Book
+from accounts.models import Book, Tag
 
 class ShippingAddress(models.Model):
     """
@@ -83,3 +83,62 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f'Order Item - {str(self.id)}'
+
+
+class BookDailySales(models.Model):
+    """
+    Units of a book sold on one day. Feeds the rolling bestseller windows.
+    """
+    book = models.ForeignKey(Book, related_name='daily_sales', on_delete=models.CASCADE)
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        One row per book per day, and don't plurarize sales
+        """
+        unique_together = ['book', 'day']
+        verbose_name_plural = "Book Daily Sales"
+
+    def __str__(self):
+        return f'{self.book} - {self.day}: {self.units}'
+
+class BestsellerRank(models.Model):
+    """
+    Materialized bestseller ranking.
+
+    Holds the units sold per book for each window, overall (no tag) and per tag,
+    so the bestsellers page reads a pre-sorted top-N instead of aggregating
+    the order items on every request.
+    """
+    ALL_TIME = 'all'
+    LAST_30_DAYS = '30d'
+    LAST_7_DAYS = '7d'
+    WINDOWS = (
+        (ALL_TIME, 'All time'),
+        (LAST_30_DAYS, 'Last 30 days'),
+        (LAST_7_DAYS, 'Last 7 days'),
+    )
+    window = models.CharField(max_length=3, choices=WINDOWS, default=ALL_TIME)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True)
+    book = models.ForeignKey(Book, related_name='bestseller_ranks', on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        One row per window, tag and book, indexed in ranking order
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'tag', 'book'],
+                                    name='bestseller_unique_tag_book'),
+            models.UniqueConstraint(fields=['window', 'book'],
+                                    condition=models.Q(tag__isnull=True),
+                                    name='bestseller_unique_book'),
+        ]
+        indexes = [
+            models.Index(fields=['window', 'tag', '-units', 'book'],
+                         name='bestseller_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_window_display()} - {self.book}: {self.units}'
@@ -0,0 +1,135 @@
+"""
+Maintains the materialized bestseller rankings.
+
+Orders add their sold units to the daily sales and ranking tables as they are
+placed, so the bestsellers page never aggregates the order items itself. The
+rolling windows are re-derived from the (small) daily sales table by
+``refresh_window``, and ``rebuild_rankings`` recomputes everything from the
+order history.
+"""
+import datetime
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from accounts.models import Book
+from .models import BestsellerRank, BookDailySales, OrderItem
+
+# Length in days of the rolling windows
+WINDOW_DAYS = {
+    BestsellerRank.LAST_30_DAYS: 30,
+    BestsellerRank.LAST_7_DAYS: 7,
+}
+
+
+def book_tags(book_ids) -> dict[int, list[int]]:
+    """
+    Map each of the given books to the ids of its tags with a single query.
+    """
+    tags = defaultdict(list)
+    rows = Book.tags.through.objects.filter(book_id__in=book_ids).values_list('book_id', 'tag_id')
+    for book_id, tag_id in rows:
+        tags[book_id].append(tag_id)
+    return tags
+
+def _increment(model, lookup, units):
+    """
+    Add ``units`` to the row matching ``lookup``, creating it if it is missing.
+    """
+    if model.objects.filter(**lookup).update(units=F('units') + units):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(units=units, **lookup)
+    except IntegrityError:
+        # Another order created the row in the meantime
+        model.objects.filter(**lookup).update(units=F('units') + units)
+
+def record_sales(sold: dict[int, int], day: datetime.date | None = None):
+    """
+    Add the units of a placed order to the daily sales and to every ranking
+    (all windows, overall and per tag of each book).
+    """
+    if not sold:
+        return
+    day = day or timezone.localdate()
+    tags = book_tags(sold.keys())
+    with transaction.atomic():
+        for book_id, units in sold.items():
+            _increment(BookDailySales, {'book_id': book_id, 'day': day}, units)
+            for window, _ in BestsellerRank.WINDOWS:
+                for tag_id in [None, *tags[book_id]]:
+                    _increment(BestsellerRank,
+                               {'window': window, 'tag_id': tag_id, 'book_id': book_id},
+                               units)
+
+def _ranking_rows(window, totals, tags):
+    """
+    Build the overall and per tag ranking rows of a window from its totals.
+    """
+    rows = []
+    for book_id, units in totals.items():
+        rows.append(BestsellerRank(window=window, book_id=book_id, units=units))
+        for tag_id in tags[book_id]:
+            rows.append(BestsellerRank(window=window, tag_id=tag_id, book_id=book_id, units=units))
+    return rows
+
+def refresh_window(window: str, today: datetime.date | None = None):
+    """
+    Recompute one ranking window from the daily sales table.
+    Rolling windows only count the days inside the window, ending today.
+    """
+    daily_sales = BookDailySales.objects.all()
+    if window in WINDOW_DAYS:
+        today = today or timezone.localdate()
+        start = today - datetime.timedelta(days=WINDOW_DAYS[window] - 1)
+        daily_sales = daily_sales.filter(day__gte=start)
+
+    totals = dict(daily_sales.values('book_id')
+                  .annotate(total=Sum('units'))
+                  .values_list('book_id', 'total'))
+    tags = book_tags(totals.keys())
+    with transaction.atomic():
+        BestsellerRank.objects.filter(window=window).delete()
+        BestsellerRank.objects.bulk_create(_ranking_rows(window, totals, tags), batch_size=1000)
+
+def rebuild_daily_sales():
+    """
+    Recompute the daily sales table from the order items.
+    """
+    rows = (OrderItem.objects.filter(book__isnull=False, order__isnull=False)
+            .annotate(day=TruncDate('order__date_ordered'))
+            .values('book_id', 'day')
+            .annotate(units=Sum('quantity'))
+            .values_list('book_id', 'day', 'units'))
+    daily_sales = [BookDailySales(book_id=book_id, day=day, units=units)
+                   for book_id, day, units in rows]
+    with transaction.atomic():
+        BookDailySales.objects.all().delete()
+        BookDailySales.objects.bulk_create(daily_sales, batch_size=1000)
+
+def rebuild_rankings(today: datetime.date | None = None):
+    """
+    Rebuild the daily sales and every ranking window from scratch.
+    """
+    with transaction.atomic():
+        rebuild_daily_sales()
+        for window, _ in BestsellerRank.WINDOWS:
+            refresh_window(window, today)
+
+def top_books(window: str = BestsellerRank.ALL_TIME, tag_id: int | None = None,
+              limit: int = 10, fields=('id', 'title')) -> list[Book]:
+    """
+    Return the ``limit`` best selling books of a window, overall or for one tag,
+    in a single indexed query. Each book gets a ``units_sold`` attribute.
+    """
+    ranks = (BestsellerRank.objects.filter(window=window, tag_id=tag_id)
+             .select_related('book')
+             .only('units', 'book', *(f'book__{name}' for name in fields))
+             .order_by('-units', 'book_id')[:limit])
+    books = []
+    for rank in ranks:
+        rank.book.units_sold = rank.units
+        books.append(rank.book)
+    return books
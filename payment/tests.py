@@ -1 +1,96 @@
-# Create your tests here.
+"""
+Module for testing the payment app.
+"""
+import datetime
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import Book, Tag
+from .models import BestsellerRank, BookDailySales, Order, OrderItem
+from .rankings import rebuild_rankings, record_sales, refresh_window, top_books
+
+
+class BestsellerRankingTests(TestCase):
+    """
+    Test case for the materialized bestseller rankings.
+    """
+    def setUp(self):
+        """
+        Create a tagged and an untagged book.
+        """
+        self.tag = Tag.objects.create(name='Fantasy')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', price=20,
+                                        image='uploads/books/dune.png')
+        self.emma = Book.objects.create(title='Emma', author='Jane Austen', price=10,
+                                        image='uploads/books/emma.png')
+        self.dune.tags.add(self.tag)
+
+    def test_record_sales_updates_every_ranking(self):
+        """
+        Test that placed orders are added to the overall and per tag rankings.
+        """
+        record_sales({self.dune.id: 1, self.emma.id: 2})
+        record_sales({self.dune.id: 3})
+
+        books = top_books(limit=2)
+        self.assertEqual([book.title for book in books], ['Dune', 'Emma'])
+        self.assertEqual(books[0].units_sold, 4)
+        self.assertEqual([book.title for book in top_books(BestsellerRank.LAST_7_DAYS,
+                                                           tag_id=self.tag.id)], ['Dune'])
+        self.assertEqual(BookDailySales.objects.get(book=self.dune).units, 4)
+
+    def test_refresh_window_drops_expired_days(self):
+        """
+        Test that the rolling windows only count the days inside the window.
+        """
+        today = timezone.localdate()
+        record_sales({self.emma.id: 5}, day=today - datetime.timedelta(days=10))
+        record_sales({self.dune.id: 1}, day=today)
+
+        refresh_window(BestsellerRank.LAST_7_DAYS, today)
+        self.assertEqual([book.title for book in top_books(BestsellerRank.LAST_7_DAYS)], ['Dune'])
+        self.assertEqual([book.title for book in top_books(BestsellerRank.LAST_30_DAYS)],
+                         ['Emma', 'Dune'])
+
+    def test_rebuild_from_order_items(self):
+        """
+        Test that the rankings can be rebuilt from the order history.
+        """
+        order = Order.objects.create(full_name='Viki', email='viki@gmail.com',
+                                     shipping_address='Sofia', amount_paid=40)
+        OrderItem.objects.create(order=order, book=self.emma, quantity=3, price=10)
+        OrderItem.objects.create(order=order, book=self.dune, quantity=1, price=20)
+
+        rebuild_rankings()
+        self.assertEqual([book.title for book in top_books()], ['Emma', 'Dune'])
+
+        response = self.client.get(reverse('bestsellers'), {'tag': self.tag.id})
+        self.assertEqual([book.title for book in response.context['books']], ['Dune'])
+
+
+class ProcessOrderTests(TestCase):
+    """
+    Test case for placing an order from the cart.
+    """
+    def test_order_items_created_from_the_cart(self):
+        """
+        Test that the order and its items are saved with the cart's quantities and prices.
+        """
+        dune = Book.objects.create(title='Dune', author='Frank Herbert', price=20,
+                                   image='uploads/books/dune.png')
+        emma = Book.objects.create(title='Emma', author='Jane Austen', price=10,
+                                   image='uploads/books/emma.png')
+        session = self.client.session
+        session['session_key'] = {str(dune.id): 1, str(emma.id): 3}
+        session['my_shipping'] = {'shipping_full_name': 'Olga', 'shipping_email': 'o@example.com',
+                                  'shipping_address1': 'Main 1', 'shipping_city': 'Sofia',
+                                  'shipping_country': 'Bulgaria'}
+        session.save()
+
+        self.client.post(reverse('process_order'), {'card_name': 'Olga'})
+
+        order = Order.objects.get()
+        self.assertEqual(order.amount_paid, 50)
+        self.assertEqual(sorted(order.orderitem_set.values_list('book__title', 'quantity', 'price')),
+                         [('Dune', 1, 20), ('Emma', 3, 10)])
+        self.assertEqual([book.title for book in top_books()], ['Emma', 'Dune'])
@@ -6,9 +6,11 @@ from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from cart.cart import Cart
-from accounts.models import Customer
+from cart.models import CartItem
 from payment.forms import ShippingForm, PaymentForm
 from payment.models import ShippingAddress, Order, OrderItem
+from payment.rankings import record_sales
+from recommendations.co_purchases import record_basket
 
 
 def payment_success(request: HttpRequest) -> HttpResponse:
@@ -22,28 +24,23 @@ def checkout(request: HttpRequest) -> HttpResponse:
     Handles the checkout process for both authenticated users and guests.
     """
     # Get the cart
-    cart = Cart(request)
-    cart_books = cart.get_books
-    quantities = cart.get_quants
-    totals = cart.cart_total()
+    snapshot = Cart(request).snapshot
 
     if request.user.is_authenticated:
         # Checkout as logged in user
         shipping_user = ShippingAddress.objects.get(user__id=request.user.id)
         shipping_form = ShippingForm(request.POST or None, instance=shipping_user)
         return render(request, "payment/checkout.html",
-                      {'cart_books': cart_books,
-                       "quantities": quantities,
-                       "totals":totals,
+                      {'cart_lines': snapshot.lines,
+                       "totals": snapshot.total,
                        "shipping_form":shipping_form}
                     )
 
     # Checkout as guest
     shipping_form = ShippingForm(request.POST or None)
     return render(request, "payment/checkout.html",
-                    {'cart_books': cart_books,
-                    "quantities": quantities,
-                    "totals":totals,
+                    {'cart_lines': snapshot.lines,
+                    "totals": snapshot.total,
                     "shipping_form":shipping_form}
                 )
 
@@ -53,10 +50,7 @@ def billing_info(request: HttpRequest) -> HttpResponse:
     """
     if request.POST:
         # Get the cart
-        cart = Cart(request)
-        cart_books = cart.get_books
-        quantities = cart.get_quants
-        totals = cart.cart_total()
+        snapshot = Cart(request).snapshot
         my_shipping = request.POST
         # create a session with shipping info
         request.session['my_shipping'] = my_shipping
@@ -64,9 +58,8 @@ def billing_info(request: HttpRequest) -> HttpResponse:
         # get the billing form
         billing_form = PaymentForm(request.POST)
         return render(request, "payment/billing_info.html",
-                    {'cart_books': cart_books,
-                        'quantities': quantities,
-                        'totals': totals,
+                    {'cart_lines': snapshot.lines,
+                        'totals': snapshot.total,
                         'shipping_info': request.POST,
                         'billing_form': billing_form
                         })
@@ -83,10 +76,7 @@ def process_order(request: HttpRequest) -> HttpResponse:
         return redirect('home')
 
     # Get the cart
-    cart = Cart(request)
-    cart_books = cart.get_books
-    quantities = cart.get_quants
-    totals = cart.cart_total()
+    snapshot = Cart(request).snapshot
 
     # Get billing info from the last page
     payment_form = PaymentForm(request.POST or None)
@@ -101,7 +91,7 @@ def process_order(request: HttpRequest) -> HttpResponse:
     email = my_shipping['shipping_email']
     # create shipping address from session info
     shipping_address = f"{my_shipping['shipping_address1']}\n{my_shipping['shipping_city']}\n{my_shipping['shipping_country']}"
-    amount_paid = totals
+    amount_paid = snapshot.total
 
     # Determine if the user is logged in
     user = request.user if request.user.is_authenticated else None
@@ -119,41 +109,38 @@ def process_order(request: HttpRequest) -> HttpResponse:
         order_data['user'] = user
         create_order = Order.objects.create(**order_data)
         # Save cart items (order items)
-        create_order_items(create_order, cart_books, quantities, user)
+        create_order_items(create_order, snapshot, user)
         clear_user_cart(user)
     else:
         # Guest user
         create_order = Order.objects.create(**order_data)
-        create_order_items(create_order, cart_books, quantities)
+        create_order_items(create_order, snapshot)
 
     # Clear session and cart
     clear_session_cart(request)
     messages.success(request, "Order placed successfully!")
     return redirect('home')
 
-def create_order_items(order, cart_books, quantities, user=None):
-    """
-    Helper function for process_order to create order items based on cart books and quantities.
-    """
-    for book in cart_books():
-        book_id = book.id
-        book_price = book.price
-        for key, value in quantities().items():
-            if int(key) == book.id:
-                OrderItem.objects.create(
-                    order=order,
-                    book_id=book_id,
-                    user=user,
-                    quantity=value,
-                    price=book_price
-                )
+def create_order_items(order, snapshot, user=None):
+    """
+    Helper function for process_order to create the order items of the cart snapshot
+    with a single insert.
+    """
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, book=line.book, user=user,
+                  quantity=line.quantity, price=line.book.price)
+        for line in snapshot.lines
+    ])
+    sold = snapshot.quantities
+    # Keep the bestseller rankings and the bought together counts up to date with this order
+    record_sales(sold)
+    record_basket(sold)
 
 def clear_user_cart(user):
     """
     Helper function for process_order to clear the old cart from the database.
     """
-    current_user = Customer.objects.filter(user__id=user.id)
-    current_user.update(old_cart="")
+    CartItem.objects.filter(user_id=user.id).delete()
 
 
 def clear_session_cart(request):
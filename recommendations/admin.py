@@ -0,0 +1,12 @@
+"""
+Admin configuration for the recommendations app.
+"""
+from django.contrib import admin
+from .models import (BookCoPurchase, BookNeighbor, BookPopularity, BookPurchaseCount,
+                     PendingContentBook)
+
+admin.site.register(BookNeighbor)
+admin.site.register(BookPurchaseCount)
+admin.site.register(BookCoPurchase)
+admin.site.register(BookPopularity)
+admin.site.register(PendingContentBook)
@@ -0,0 +1,18 @@
+"""
+This module contains the configuration for the recommendations app
+"""
+from django.apps import AppConfig
+
+
+class RecommendationsConfig(AppConfig):
+    """
+    Configuration class for the recommendations app.
+    """
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'recommendations'
+
+    def ready(self):
+        """
+        Connect the signal handlers of the app
+        """
+        from . import signals  # pylint: disable=import-outside-toplevel,unused-import
@@ -0,0 +1,107 @@
+"""
+Versioned on-disk storage of the recommender model artifacts.
+
+Each artifact is a set of ``.npy`` arrays saved in its own version directory
+under ``RECOMMENDER_ROOT/<name>/``. A ``CURRENT`` file names the version
+being served. Arrays are loaded memory-mapped, so every worker process
+on the machine shares the same pages instead of holding its own copy.
+"""
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+POINTER = 'CURRENT'
+META = 'meta.json'
+LOCK = '.lock'
+
+
+def artifact_dir(name: str) -> Path:
+    """
+    Directory holding every version of the artifact ``name``.
+    """
+    return Path(settings.RECOMMENDER_ROOT) / name
+
+def new_version() -> str:
+    """
+    A version name that sorts by creation time.
+    """
+    return f"{timezone.now().strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+
+def save_artifact(name: str, arrays: dict[str, np.ndarray], meta: dict | None = None) -> str:
+    """
+    Write the arrays of a new version of an artifact and make it the current one.
+    """
+    version = new_version()
+    directory = artifact_dir(name) / version
+    directory.mkdir(parents=True)
+    for key, array in arrays.items():
+        np.save(directory / f'{key}.npy', np.ascontiguousarray(array))
+    with open(directory / META, 'w', encoding='utf-8') as meta_file:
+        json.dump({**(meta or {}), 'version': version}, meta_file)
+    set_current_version(name, version)
+    return version
+
+@contextmanager
+def artifact_lock(name: str):
+    """
+    Hold the exclusive lock of an artifact across processes, so a new version
+    derived from the current one can't be replaced by a concurrent writer.
+    """
+    directory = artifact_dir(name)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / LOCK, 'a', encoding='utf-8') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def set_current_version(name: str, version: str):
+    """
+    Point the artifact at ``version``. The pointer is replaced atomically.
+    """
+    directory = artifact_dir(name)
+    with tempfile.NamedTemporaryFile('w', dir=directory, delete=False,
+                                     encoding='utf-8') as pointer:
+        pointer.write(version)
+    os.replace(pointer.name, directory / POINTER)
+
+def current_version(name: str) -> str | None:
+    """
+    The version of the artifact currently served, if one was built.
+    """
+    try:
+        return (artifact_dir(name) / POINTER).read_text(encoding='utf-8').strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_artifact(name: str, version: str) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Load the memory-mapped arrays and the metadata of one version of an artifact.
+    """
+    directory = artifact_dir(name) / version
+    with open(directory / META, encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+    arrays = {path.stem: np.load(path, mmap_mode='r') for path in directory.glob('*.npy')}
+    return arrays, meta
+
+def prune_versions(name: str, keep: int = 2) -> list[str]:
+    """
+    Delete all but the ``keep`` newest versions of an artifact, never the current one.
+    Processes still serving a deleted version keep their mapping until they switch.
+    """
+    current = current_version(name)
+    versions = sorted((path.name for path in artifact_dir(name).iterdir() if path.is_dir()),
+                      reverse=True)
+    removed = [version for version in versions[keep:] if version != current]
+    for version in removed:
+        shutil.rmtree(artifact_dir(name) / version)
+    return removed
@@ -0,0 +1,169 @@
+"""
+Benchmark and offline evaluation of the recommender engines.
+
+Synthetic ratings are generated at a given scale: books belong to genres,
+readers prefer one genre, and both the popularity of the books and the
+activity of the readers follow a power law, as real ratings do. A part of
+the ratings is held out, every engine is trained on the rest, and the run
+reports how long each step takes and the precision and recall at k of the
+recommendations against the well rated held-out books.
+"""
+import platform
+import time
+from importlib import import_module
+import numpy as np
+from django.utils import timezone
+from .engines import ENGINES
+from .item_similarity import build_ratings_matrix
+
+SCALES = (1_000, 10_000, 100_000, 1_000_000)
+
+RATINGS_PER_USER = 20
+RATINGS_PER_BOOK = 50
+GENRES = 20
+
+# Share of the ratings a reader gives to books of their favorite genre
+GENRE_AFFINITY = 0.8
+
+# Held-out ratings of at least this many stars count as relevant
+RELEVANT_STARS = 4
+
+RATING_DTYPE = [('user', np.int64), ('book', np.int64), ('stars', np.float32)]
+
+
+def _power_law(size, skew, rng):
+    """
+    Probabilities decreasing as a power of the rank, in a random order.
+    """
+    weights = 1 / np.arange(1, size + 1) ** skew
+    return rng.permutation(weights / weights.sum())
+
+def synthetic_ratings(count: int, skew: float = 1.1,
+                      seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Up to ``count`` synthetic ratings, as an array of (user, book, stars) records,
+    and the sorted ids of the books. A reader rates a book at most once, so on
+    small scales there are fewer when the most active readers run out of books.
+    """
+    rng = np.random.default_rng(seed)
+    users = max(100, count // RATINGS_PER_USER)
+    books = max(100, count // RATINGS_PER_BOOK)
+    book_genres = rng.integers(0, GENRES, books)
+    user_genres = rng.integers(0, GENRES, users)
+    popularity = _power_law(books, skew, rng)
+    activity = _power_law(users, skew, rng)
+
+    def draw(size):
+        raters = rng.choice(users, size, p=activity)
+        in_genre = rng.random(size) < GENRE_AFFINITY
+        rated = rng.choice(books, size, p=popularity)
+        for genre in range(GENRES):
+            genre_books = np.flatnonzero(book_genres == genre)
+            picks = np.flatnonzero(in_genre & (user_genres[raters] == genre))
+            if len(genre_books) and len(picks):
+                weights = popularity[genre_books] / popularity[genre_books].sum()
+                rated[picks] = rng.choice(genre_books, len(picks), p=weights)
+        liked = book_genres[rated] == user_genres[raters]
+        stars = np.where(liked, rng.integers(3, 6, size), rng.integers(1, 4, size))
+        return raters, rated, stars
+
+    # Popular books get drawn again by active readers, so draw until enough pairs are unique
+    raters, rated, stars = draw(count)
+    _, first = np.unique(raters * books + rated, return_index=True)
+    for _ in range(10):
+        if len(first) >= count:
+            break
+        more = draw(count)
+        raters, rated, stars = (np.concatenate([raters[first], more[0]]),
+                                np.concatenate([rated[first], more[1]]),
+                                np.concatenate([stars[first], more[2]]))
+        _, first = np.unique(raters * books + rated, return_index=True)
+    first = np.sort(first)[:count]
+
+    ratings = np.empty(len(first), dtype=RATING_DTYPE)
+    ratings['user'] = raters[first] + 1
+    ratings['book'] = rated[first] + 1
+    ratings['stars'] = stars[first]
+    return ratings, np.arange(1, books + 1, dtype=np.int64)
+
+def split_ratings(ratings: np.ndarray, holdout: float = 0.2,
+                  seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Split the ratings into the training ratings and the held-out ones.
+    """
+    held_out = np.random.default_rng(seed).random(len(ratings)) < holdout
+    return ratings[~held_out], ratings[held_out]
+
+def _by_user(ratings):
+    """
+    The ratings of every user as a mapping of their book ids to their stars.
+    """
+    ratings = ratings[np.argsort(ratings['user'], kind='stable')]
+    users, starts = np.unique(ratings['user'], return_index=True)
+    return {int(user): dict(zip(group['book'].tolist(), group['stars'].tolist()))
+            for user, group in zip(users, np.split(ratings, starts[1:]))}
+
+def evaluate(model, train: np.ndarray, test: np.ndarray, k: int = 10,
+             users: int = 500, seed: int = 0) -> dict:
+    """
+    Precision and recall at ``k`` of a model for a sample of the users with
+    relevant held-out ratings, and the mean time to score one user.
+    """
+    relevant = _by_user(test[test['stars'] >= RELEVANT_STARS])
+    rated = _by_user(train)
+    candidates = [user for user in relevant if user in rated]
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(candidates, min(users, len(candidates)), replace=False)
+
+    precision = recall = elapsed = 0.0
+    for user in sample.tolist():
+        started = time.perf_counter()
+        recommended = model.recommend(rated[user], k)
+        elapsed += time.perf_counter() - started
+        hits = len(set(recommended) & set(relevant[user]))
+        precision += hits / k
+        recall += hits / len(relevant[user])
+
+    evaluated = max(len(sample), 1)
+    return {
+        'users': len(sample),
+        f'precision@{k}': precision / evaluated,
+        f'recall@{k}': recall / evaluated,
+        'score_ms': elapsed / evaluated * 1000,
+    }
+
+def run_benchmark(scales=SCALES, engines=tuple(ENGINES), k: int = 10,
+                  users: int = 500, seed: int = 0) -> dict:
+    """
+    Benchmark every engine at every scale and return the report.
+    """
+    report = {
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'k': k,
+        'seed': seed,
+        'runs': [],
+    }
+    for scale in scales:
+        ratings, book_ids = synthetic_ratings(scale, seed=seed)
+        train, test = split_ratings(ratings, seed=seed)
+
+        started = time.perf_counter()
+        matrix = build_ratings_matrix(train, book_ids)
+        build_seconds = time.perf_counter() - started
+
+        for name in engines:
+            started = time.perf_counter()
+            model = import_module(ENGINES[name]).model_from_ratings(matrix, book_ids)
+            report['runs'].append({
+                'scale': scale,
+                'engine': name,
+                'ratings': len(ratings),
+                'users': int(matrix.shape[0]),
+                'books': len(book_ids),
+                'matrix_seconds': build_seconds,
+                'model_seconds': time.perf_counter() - started,
+                **evaluate(model, train, test, k, users, seed),
+            })
+    return report
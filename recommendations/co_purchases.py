@@ -0,0 +1,91 @@
+"""
+The "frequently bought together" model of the cart and book pages.
+
+Each placed order adds one to the purchase count of every book in it and to
+the co-purchase count of every pair of them. Other books are ranked by their
+lift, co(A, B) * N / (orders(A) * orders(B)), and then by the confidence
+co(A, B) / orders(A). N, the number of orders, is the same for every pair,
+so it's left out and the counts tables are all the rankings ever read.
+"""
+from collections import Counter
+from itertools import permutations
+from django.db import transaction
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast
+from accounts.models import Book
+from payment.models import OrderItem
+from .models import BookCoPurchase, BookPurchaseCount
+
+# Orders a pair of books needs before it is recommended
+MIN_SUPPORT = 2
+
+
+def _increment(rows: list, matching):
+    """
+    Add one to the ``orders`` of ``rows``: the missing ones are inserted with no
+    orders, then all of them, selected by ``matching``, are updated at once.
+    """
+    if rows:
+        type(rows[0]).objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        matching.update(orders=F('orders') + 1)
+
+def record_basket(book_ids):
+    """
+    Count the books of a placed order and every pair of them, with a fixed
+    number of queries however many books the order has.
+    """
+    book_ids = sorted(set(book_ids))
+    if not book_ids:
+        return
+    with transaction.atomic():
+        _increment([BookPurchaseCount(book_id=book_id, orders=0) for book_id in book_ids],
+                   BookPurchaseCount.objects.filter(book_id__in=book_ids))
+        # Only pairs of different books are ever stored, so these are exactly the pairs
+        _increment([BookCoPurchase(book_id=book_id, other_id=other_id, orders=0)
+                    for book_id, other_id in permutations(book_ids, 2)],
+                   BookCoPurchase.objects.filter(book_id__in=book_ids, other_id__in=book_ids))
+
+def rebuild_co_purchases() -> int:
+    """
+    Recompute both counts tables from the order history.
+    Returns the number of pairs of books stored.
+    """
+    baskets = {}
+    items = OrderItem.objects.exclude(order=None).exclude(book=None)
+    for order_id, book_id in items.values_list('order_id', 'book_id').iterator():
+        baskets.setdefault(order_id, set()).add(book_id)
+    purchases, pairs = Counter(), Counter()
+    for books in baskets.values():
+        purchases.update(books)
+        pairs.update(permutations(sorted(books), 2))
+
+    with transaction.atomic():
+        BookPurchaseCount.objects.all().delete()
+        BookCoPurchase.objects.all().delete()
+        BookPurchaseCount.objects.bulk_create(
+            [BookPurchaseCount(book_id=book_id, orders=orders)
+             for book_id, orders in purchases.items()], batch_size=1000)
+        BookCoPurchase.objects.bulk_create(
+            [BookCoPurchase(book_id=book_id, other_id=other_id, orders=orders)
+             for (book_id, other_id), orders in pairs.items()], batch_size=1000)
+    return len(pairs)
+
+def bought_together(book_ids, limit: int = 4) -> list[Book]:
+    """
+    The books most often bought with the given ones, by lift and then confidence,
+    each summed over the given books, leaving out the given books.
+    """
+    book_ids = [int(book_id) for book_id in book_ids]
+    if not book_ids:
+        return []
+    lift = Cast(F('orders'), FloatField()) / (F('book__purchase_count__orders')
+                                              * F('other__purchase_count__orders'))
+    confidence = Cast(F('orders'), FloatField()) / F('book__purchase_count__orders')
+    ranked = list(BookCoPurchase.objects
+                  .filter(book_id__in=book_ids, orders__gte=MIN_SUPPORT)
+                  .exclude(other_id__in=book_ids)
+                  .values('other_id')
+                  .annotate(lift=Sum(lift), confidence=Sum(confidence))
+                  .order_by('-lift', '-confidence', 'other_id')[:limit])
+    books = Book.objects.in_bulk([row['other_id'] for row in ranked])
+    return [books[row['other_id']] for row in ranked if row['other_id'] in books]
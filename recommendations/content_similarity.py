@@ -0,0 +1,314 @@
+"""
+Content-based similar books, for titles without any ratings.
+
+Every book is described by the words of its description, its author and its
+tag names, weighted with TF-IDF. The artifact keeps the vocabulary, the IDF
+weights, the normalized vector of every book and its top-K most similar books
+as fixed width arrays. When books are added or edited only their own vectors
+and neighbors are computed, in one batch, and they are put into or taken out
+of the neighbors of the other books. Saving a book only queues it, and the
+``update_content_similarity`` command applies the queue off the request path.
+"""
+import re
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+from django.db.models import Q
+from django.utils import timezone
+from accounts.models import Book
+from .artifacts import (artifact_lock, current_version, load_artifact, prune_versions,
+                        save_artifact)
+from .models import PendingContentBook
+
+ARTIFACT = 'content_similarity'
+
+# Number of similar books kept for every book
+DEFAULT_NEIGHBORS = 20
+
+# Cells of the dense similarity block computed at once, 32MB of float32
+BLOCK_CELLS = 2 ** 23
+
+# Queued books taken off the queue per query
+DEQUEUE_BATCH = 500
+
+WORD_RE = re.compile(r'\b\w\w+\b')
+
+
+def book_terms(document: tuple) -> list[str]:
+    """
+    Terms of a (description, author, tag names) document. The author and the tags
+    are single terms, so only the same author or tag makes books closer.
+    """
+    description, author, tags = document
+    terms = [word for word in WORD_RE.findall((description or '').lower())
+             if word not in ENGLISH_STOP_WORDS]
+    if author:
+        terms.append(f'author:{author.strip().lower()}')
+    terms.extend(f'tag:{tag.strip().lower()}' for tag in tags)
+    return terms
+
+def book_documents(book_ids=None) -> tuple[np.ndarray, list[tuple]]:
+    """
+    Sorted ids and documents of the given books, or of every book, in two queries.
+    """
+    books = Book.objects.order_by('id')
+    links = Book.tags.through.objects.all()
+    if book_ids is not None:
+        books = books.filter(id__in=book_ids)
+        links = links.filter(book_id__in=book_ids)
+    tags = {}
+    for book_id, name in links.values_list('book_id', 'tag__name'):
+        tags.setdefault(book_id, []).append(name)
+    rows = list(books.values_list('id', 'descreption', 'author'))
+    return (np.array([row[0] for row in rows], dtype=np.int64),
+            [(description, author, tags.get(book_id, []))
+             for book_id, description, author in rows])
+
+
+@dataclass
+class ContentModel:
+    """
+    TF-IDF vectors of the books and their most similar books.
+
+    ``book_ids`` is sorted and gives the book of every row of ``vectors``,
+    ``neighbors`` and ``scores``. Rows of ``neighbors`` are padded with 0.
+    """
+    book_ids: np.ndarray
+    terms: np.ndarray
+    idf: np.ndarray
+    vectors: sparse.csr_matrix
+    neighbors: np.ndarray
+    scores: np.ndarray
+    version: str = ''
+
+    def vectorizer(self) -> TfidfVectorizer:
+        """
+        Vectorizer with the vocabulary and the IDF weights of the model.
+        """
+        vectorizer = TfidfVectorizer(analyzer=book_terms, sublinear_tf=True,
+                                     vocabulary=[str(term) for term in self.terms],
+                                     dtype=np.float32)
+        vectorizer.idf_ = np.asarray(self.idf)
+        return vectorizer
+
+    def similar(self, book_id: int, limit: int = 4) -> list[int]:
+        """
+        Ids of the books most similar to a book, best first.
+        """
+        position = np.searchsorted(self.book_ids, book_id)
+        if position == len(self.book_ids) or self.book_ids[position] != book_id:
+            return []
+        neighbors = self.neighbors[position]
+        return [int(other) for other in neighbors[neighbors > 0][:limit]]
+
+
+def _top_neighbors(similarity, book_ids, neighbors):
+    """
+    The ``neighbors`` most similar books of each row of a block of similarities,
+    as fixed width arrays of book ids and scores.
+    """
+    padded_ids = np.zeros((len(similarity), neighbors), dtype=np.int64)
+    padded_scores = np.zeros((len(similarity), neighbors), dtype=np.float32)
+    width = min(neighbors, similarity.shape[1])
+    if not width:
+        return padded_ids, padded_scores
+    best = np.argpartition(-similarity, width - 1, axis=1)[:, :width]
+    scores = np.take_along_axis(similarity, best, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    ids = np.where(scores > 0, book_ids[best], 0)
+    padded_ids[:, :width] = ids
+    padded_scores[:, :width] = np.maximum(scores, 0)
+    return padded_ids, padded_scores
+
+def compute_model(neighbors: int = DEFAULT_NEIGHBORS) -> ContentModel:
+    """
+    Fit the TF-IDF weights on every book and find the similar books of each one,
+    a block of books at a time.
+    """
+    book_ids, documents = book_documents()
+    size = len(book_ids)
+    if not any(book_terms(document) for document in documents):
+        # Without a single term there is no vocabulary to fit
+        return ContentModel(book_ids, np.array([], dtype=str), np.array([], dtype=np.float32),
+                            sparse.csr_matrix((size, 0), dtype=np.float32),
+                            np.zeros((size, neighbors), dtype=np.int64),
+                            np.zeros((size, neighbors), dtype=np.float32))
+    vectorizer = TfidfVectorizer(analyzer=book_terms, sublinear_tf=True, dtype=np.float32)
+    vectors = vectorizer.fit_transform(documents)
+    all_ids = np.zeros((size, neighbors), dtype=np.int64)
+    all_scores = np.zeros((size, neighbors), dtype=np.float32)
+    block = max(1, BLOCK_CELLS // size)
+    for start in range(0, size, block):
+        stop = min(start + block, size)
+        similarity = (vectors[start:stop] @ vectors.T).toarray()
+        rows = np.arange(stop - start)
+        similarity[rows, start + rows] = 0
+        all_ids[start:stop], all_scores[start:stop] = _top_neighbors(similarity, book_ids,
+                                                                     neighbors)
+    return ContentModel(book_ids, vectorizer.get_feature_names_out().astype(str),
+                        vectorizer.idf_.astype(np.float32), vectors.tocsr(),
+                        all_ids, all_scores)
+
+def save_model(model: ContentModel) -> str:
+    """
+    Save the model as a new version of the artifact and serve it from now on.
+    """
+    vectors = model.vectors
+    # scipy needs both index arrays in the same type to use them without a copy
+    index_dtype = np.int32 if vectors.nnz < 2 ** 31 else np.int64
+    model.version = save_artifact(ARTIFACT, {
+        'book_ids': model.book_ids,
+        'terms': model.terms,
+        'idf': model.idf,
+        'data': vectors.data.astype(np.float32),
+        'indices': vectors.indices.astype(index_dtype),
+        'indptr': vectors.indptr.astype(index_dtype),
+        'neighbors': model.neighbors,
+        'scores': model.scores,
+    }, {'books': len(model.book_ids), 'terms': len(model.terms),
+        'neighbors': int(model.neighbors.shape[1])})
+    return model.version
+
+
+_loaded = {}
+
+
+def load_model() -> ContentModel | None:
+    """
+    Return the current version of the model, memory-mapped and kept per process.
+    """
+    version = current_version(ARTIFACT)
+    if version is None:
+        return None
+    if version not in _loaded:
+        arrays, _ = load_artifact(ARTIFACT, version)
+        vectors = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                    shape=(len(arrays['book_ids']), len(arrays['terms'])))
+        _loaded.clear()
+        _loaded[version] = ContentModel(arrays['book_ids'], arrays['terms'], arrays['idf'],
+                                        vectors, arrays['neighbors'], arrays['scores'], version)
+    return _loaded[version]
+
+def _merge_neighbors(neighbors, scores, candidate_ids, candidates):
+    """
+    Put the ``candidate_ids`` books among the neighbors of the others, in place,
+    where ``candidates`` holds the similarity of every row to each candidate.
+    Only the rows a candidate gets into are sorted again.
+    """
+    rows = np.flatnonzero((candidates > scores.min(axis=1)[:, np.newaxis]).any(axis=1))
+    if not len(rows):
+        return
+    width = neighbors.shape[1]
+    merged_ids = np.hstack([neighbors[rows],
+                            np.broadcast_to(candidate_ids, (len(rows), len(candidate_ids)))])
+    merged_scores = np.hstack([scores[rows], candidates[rows]])
+    best = np.argpartition(-merged_scores, width - 1, axis=1)[:, :width]
+    best_scores = np.take_along_axis(merged_scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    neighbors[rows] = np.where(best_scores > 0, np.take_along_axis(merged_ids, best, axis=1), 0)
+    scores[rows] = np.maximum(best_scores, 0)
+
+def update_books(book_ids) -> str | None:
+    """
+    Recompute the vectors and neighbors of added or edited books and put them
+    among the neighbors of the other books, with the vocabulary of the last full
+    build. Returns the new version, or None when the model wasn't built yet or
+    was built without any terms. Writers take turns, each one starting from the
+    version the previous one saved.
+    """
+    with artifact_lock(ARTIFACT):
+        return _update_books(book_ids)
+
+def _update_books(book_ids):
+    model = load_model()
+    if model is None or not len(model.terms):
+        return None
+    book_ids = np.unique(np.asarray(list(book_ids), dtype=np.int64))
+    found, documents = book_documents(book_ids.tolist())
+
+    # Take the whole batch out at once, deleted books only leave gaps in the
+    # neighbors of the others, filled again by the next full build
+    keep = ~np.isin(model.book_ids, book_ids)
+    neighbors = np.array(model.neighbors[keep])
+    scores = np.array(model.scores[keep])
+    removed = np.isin(neighbors, book_ids)
+    neighbors[removed], scores[removed] = 0, 0
+    ids = np.concatenate([model.book_ids[keep], found])
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    new_vectors = (model.vectorizer().transform(documents).astype(np.float32) if documents
+                   else sparse.csr_matrix((0, len(model.terms)), dtype=np.float32))
+    vectors = sparse.vstack([model.vectors[keep], new_vectors], format='csr')[order]
+    added = np.flatnonzero(order >= keep.sum())
+    kept = np.flatnonzero(order < keep.sum())
+    width = neighbors.shape[1]
+    all_neighbors = np.zeros((len(ids), width), dtype=np.int64)
+    all_scores = np.zeros((len(ids), width), dtype=np.float32)
+    all_neighbors[kept], all_scores[kept] = neighbors, scores
+
+    block = max(1, BLOCK_CELLS // max(len(ids), 1))
+    for start in range(0, len(added), block):
+        rows = added[start:start + block]
+        similarity = (vectors[rows] @ vectors.T).toarray()
+        similarity[np.arange(len(rows)), rows] = 0
+        all_neighbors[rows], all_scores[rows] = _top_neighbors(similarity, ids, width)
+        # Added books among each other are already ranked by their own rows
+        kept_neighbors, kept_scores = all_neighbors[kept], all_scores[kept]
+        _merge_neighbors(kept_neighbors, kept_scores, ids[rows], similarity[:, kept].T)
+        all_neighbors[kept], all_scores[kept] = kept_neighbors, kept_scores
+
+    version = save_model(ContentModel(ids, model.terms, model.idf, vectors,
+                                      all_neighbors, all_scores))
+    prune_versions(ARTIFACT)
+    return version
+
+def queue_books(book_ids):
+    """
+    Queue books for the next content update, in the current transaction.
+    """
+    now = timezone.now()
+    PendingContentBook.objects.bulk_create(
+        [PendingContentBook(book_id=book_id, queued_at=now) for book_id in set(book_ids)],
+        update_conflicts=True, unique_fields=['book_id'], update_fields=['queued_at'])
+
+def queued_books() -> list[tuple[int, object]]:
+    """
+    The ``(book id, queued at)`` of every queued book.
+    """
+    return list(PendingContentBook.objects.values_list('book_id', 'queued_at'))
+
+def dequeue_books(queued: list[tuple[int, object]]):
+    """
+    Take books off the queue, unless they were queued again since ``queued`` was read.
+    """
+    for start in range(0, len(queued), DEQUEUE_BATCH):
+        PendingContentBook.objects.filter(reduce(or_, (
+            Q(book_id=book_id, queued_at=queued_at)
+            for book_id, queued_at in queued[start:start + DEQUEUE_BATCH]))).delete()
+
+def update_queued_books() -> tuple[int, str | None]:
+    """
+    Apply the queued books to the model in one update and take them off the
+    queue. Returns the number of books and the new version, which is None when
+    the model wasn't built yet and the next full build picks them up.
+    """
+    queued = queued_books()
+    if not queued:
+        return 0, None
+    version = update_books(book_id for book_id, _ in queued)
+    dequeue_books(queued)
+    return len(queued), version
+
+def similar_books(book_id: int, limit: int = 4) -> list[int]:
+    """
+    Ids of the books most similar in content to a book, best first.
+    """
+    model = load_model()
+    return model.similar(book_id, limit) if model else []
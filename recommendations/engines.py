@@ -0,0 +1,29 @@
+"""
+Choice of the recommender engine serving the recommendations page.
+
+Each engine is a module with ``compute_model``, ``model_from_ratings``,
+``save_model`` and ``load_model`` functions, and models with a ``recommend`` method taking
+the rated books (or a mapping of them to their stars) and a limit.
+The ``RECOMMENDER_ENGINE`` setting picks one of ``ENGINES``.
+"""
+from importlib import import_module
+from django.conf import settings
+
+ENGINES = {
+    'item_similarity': 'recommendations.item_similarity',
+    'latent_factors': 'recommendations.latent_factors',
+}
+DEFAULT_ENGINE = 'item_similarity'
+
+
+def engine_name() -> str:
+    """
+    Name of the configured engine.
+    """
+    return getattr(settings, 'RECOMMENDER_ENGINE', DEFAULT_ENGINE)
+
+def get_engine():
+    """
+    Module of the configured engine.
+    """
+    return import_module(ENGINES[engine_name()])
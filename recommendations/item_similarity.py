@@ -0,0 +1,201 @@
+"""
+Item-item collaborative filtering model used by the recommendations page.
+
+The book-to-book cosine similarities are computed offline from the ratings
+in ``ProductReviews`` and only the strongest neighbors of each book are kept,
+as a sparse matrix saved as a versioned artifact. Serving a user then only
+means reading the rows of the books they rated.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from accounts.models import Book, ProductReviews
+from .artifacts import current_version, load_artifact, save_artifact
+
+ARTIFACT = 'item_similarity'
+
+# Number of most similar books kept for every book
+DEFAULT_NEIGHBORS = 50
+
+# Rows fetched per round trip when reading the ratings
+RATINGS_CHUNK_SIZE = 10000
+
+# Cells of the dense similarity block computed at once, 32MB of float32
+BLOCK_CELLS = 2 ** 23
+
+
+@dataclass
+class ItemSimilarityModel:
+    """
+    Sparse top-K book similarity matrix.
+
+    ``book_ids`` is sorted and gives the book id of every row and column
+    of ``similarity``.
+    """
+    book_ids: np.ndarray
+    similarity: sparse.csr_matrix
+    version: str = ''
+
+    def positions(self, book_ids) -> np.ndarray:
+        """
+        Rows of the given books, skipping the books the model doesn't know.
+        """
+        book_ids = np.asarray(list(book_ids), dtype=np.int64)
+        positions = np.searchsorted(self.book_ids, book_ids)
+        positions = positions[positions < len(self.book_ids)]
+        return positions[np.isin(self.book_ids[positions], book_ids)]
+
+    def recommend(self, rated_book_ids, limit: int = 3) -> list[int]:
+        """
+        Ids of the ``limit`` books most similar on average to the rated books,
+        leaving out the rated books themselves. A mapping of book ids to
+        weights, e.g. their stars, makes it a weighted average.
+        """
+        positions = self.positions(rated_book_ids)
+        if not len(positions):
+            return []
+        rows = self.similarity[positions]
+        weights = np.ones(len(positions))
+        if isinstance(rated_book_ids, dict):
+            weights = np.array([rated_book_ids[int(book_id)]
+                                for book_id in self.book_ids[positions]], dtype=np.float64)
+        candidates, inverse = np.unique(rows.indices, return_inverse=True)
+        scores = np.bincount(inverse, weights=rows.data * np.repeat(weights, np.diff(rows.indptr)))
+        scores /= weights.sum()
+
+        keep = ~np.isin(candidates, positions) & (scores > 0)
+        candidates, scores = candidates[keep], scores[keep]
+        best = np.argsort(-scores, kind='stable')[:limit]
+        return [int(book_id) for book_id in self.book_ids[candidates[best]]]
+
+
+def ratings_matrix() -> tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Build the sparse users x books matrix of stars from a single query.
+    Returns the matrix and the sorted book ids of its columns.
+    """
+    book_ids = np.fromiter(Book.objects.order_by('id').values_list('id', flat=True),
+                           dtype=np.int64)
+    reviews = ProductReviews.objects.values_list('user_id', 'book_id', 'stars')
+    ratings = np.fromiter(reviews.iterator(chunk_size=RATINGS_CHUNK_SIZE),
+                          dtype=[('user', np.int64), ('book', np.int64), ('stars', np.float32)])
+    return build_ratings_matrix(ratings, book_ids), book_ids
+
+def build_ratings_matrix(ratings: np.ndarray, book_ids: np.ndarray) -> sparse.csr_matrix:
+    """
+    Build the sparse users x books matrix from an array of (user, book, stars)
+    records, with a column for each of the sorted ``book_ids``.
+    """
+    # ids to contiguous row and column numbers
+    user_ids, rows = np.unique(ratings['user'], return_inverse=True)
+    columns = np.searchsorted(book_ids, ratings['book'])
+    return sparse.csr_matrix((ratings['stars'], (rows, columns)),
+                             shape=(len(user_ids), len(book_ids)), dtype=np.float32)
+
+def top_k(similarity: np.ndarray, neighbors: int, first_row: int = 0) -> sparse.csr_matrix:
+    """
+    Keep the ``neighbors`` highest positive similarities of every row of a block
+    of the similarity matrix starting at ``first_row``, without the diagonal.
+    """
+    similarity = np.array(similarity, dtype=np.float32)
+    rows = np.arange(similarity.shape[0])
+    similarity[rows, first_row + rows] = 0
+    if similarity.shape[1] > neighbors:
+        weakest = np.argpartition(-similarity, neighbors, axis=1)[:, neighbors:]
+        np.put_along_axis(similarity, weakest, 0, axis=1)
+    similarity[similarity < 0] = 0
+    return sparse.csr_matrix(similarity)
+
+def similarity_rows(normalized: sparse.csc_matrix, start: int, stop: int,
+                    neighbors: int) -> sparse.csr_matrix:
+    """
+    Top-K cosine similarities of the books in columns ``start:stop``
+    with every book, from the column normalized ratings matrix.
+    """
+    similarity = (normalized[:, start:stop].T @ normalized).toarray()
+    return top_k(similarity, neighbors, start)
+
+# Ratings matrix of the worker processes, sent once when each worker starts
+_shard = {}
+
+
+def _start_shard_worker(normalized):
+    _shard['matrix'] = normalized
+
+def _shard_rows(start, stop, neighbors):
+    return similarity_rows(_shard['matrix'], start, stop, neighbors)
+
+def compute_model(neighbors: int = DEFAULT_NEIGHBORS,
+                  workers: int | None = 1) -> ItemSimilarityModel:
+    """
+    Compute the item similarity model from the current ratings.
+    """
+    return model_from_ratings(*ratings_matrix(), neighbors=neighbors, workers=workers)
+
+def model_from_ratings(matrix: sparse.csr_matrix, book_ids: np.ndarray,
+                       neighbors: int = DEFAULT_NEIGHBORS,
+                       workers: int | None = 1) -> ItemSimilarityModel:
+    """
+    Compute the item similarity model from a ratings matrix.
+
+    The similarities are computed on the sparse matrix a block of books at
+    a time, so only one block of the dense book x book matrix is in memory.
+    The blocks are ranges of book ids, and with more than one worker they
+    are computed on a process pool (``workers=None`` uses every CPU).
+    """
+    size = len(book_ids)
+    if not size or not matrix.nnz:
+        return ItemSimilarityModel(book_ids, sparse.csr_matrix((size, size), dtype=np.float32))
+    normalized = normalize(matrix.tocsc(), axis=0)
+    block = max(1, BLOCK_CELLS // size)
+    starts = list(range(0, size, block))
+    stops = [min(start + block, size) for start in starts]
+
+    if workers == 1 or len(starts) == 1:
+        blocks = [similarity_rows(normalized, start, stop, neighbors)
+                  for start, stop in zip(starts, stops)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_start_shard_worker,
+                                 initargs=(normalized,)) as pool:
+            blocks = list(pool.map(_shard_rows, starts, stops, [neighbors] * len(starts)))
+    return ItemSimilarityModel(book_ids, sparse.vstack(blocks, format='csr'))
+
+def save_model(model: ItemSimilarityModel) -> str:
+    """
+    Save the model as a new version of the artifact and serve it from now on.
+    """
+    similarity = model.similarity
+    # scipy needs both index arrays in the same type to use them without a copy
+    index_dtype = np.int32 if similarity.nnz < 2 ** 31 else np.int64
+    model.version = save_artifact(ARTIFACT, {
+        'book_ids': model.book_ids,
+        'data': similarity.data.astype(np.float32),
+        'indices': similarity.indices.astype(index_dtype),
+        'indptr': similarity.indptr.astype(index_dtype),
+    }, {'books': len(model.book_ids), 'neighbors': int(np.diff(similarity.indptr).max(initial=0))})
+    return model.version
+
+
+_loaded = {}
+
+
+def load_model() -> ItemSimilarityModel | None:
+    """
+    Return the current version of the model, memory-mapped and kept per process.
+
+    The version pointer is read on every call, so a serving process switches
+    to a newly built model on its next request, without a restart.
+    """
+    version = current_version(ARTIFACT)
+    if version is None:
+        return None
+    if version not in _loaded:
+        arrays, _ = load_artifact(ARTIFACT, version)
+        size = len(arrays['book_ids'])
+        similarity = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                       shape=(size, size), copy=False)
+        _loaded.clear()
+        _loaded[version] = ItemSimilarityModel(arrays['book_ids'], similarity, version)
+    return _loaded[version]
@@ -0,0 +1,110 @@
+"""
+Latent factor recommender for large rating sets.
+
+The sparse users x books ratings matrix is factorized with a truncated SVD
+into a few dozen factors per book, so nothing of the size of books x books
+is ever built. A user is folded into the factor space from their ratings
+and every book is scored with a single matrix-vector product, the best
+ones being picked with ``argpartition``.
+"""
+from dataclasses import dataclass
+from functools import cached_property
+import numpy as np
+from scipy import sparse
+from sklearn.utils.extmath import randomized_svd
+from .artifacts import current_version, load_artifact, save_artifact
+from .item_similarity import ratings_matrix
+
+ARTIFACT = 'latent_factors'
+
+# Number of latent factors kept for every book
+DEFAULT_FACTORS = 64
+
+
+@dataclass
+class LatentFactorModel:
+    """
+    Book factors of the truncated SVD of the ratings matrix.
+
+    ``book_ids`` is sorted and gives the book id of every row of ``factors``.
+    """
+    book_ids: np.ndarray
+    factors: np.ndarray
+    version: str = ''
+
+    @cached_property
+    def index(self) -> dict[int, int]:
+        """
+        Row of every book id.
+        """
+        return {int(book_id): position for position, book_id in enumerate(self.book_ids)}
+
+    def recommend(self, rated_book_ids, limit: int = 3) -> list[int]:
+        """
+        Ids of the ``limit`` best scored books for a user who rated the given books,
+        leaving out the rated books themselves. A mapping of book ids to stars
+        weights the books by their rating.
+        """
+        if not isinstance(rated_book_ids, dict):
+            rated_book_ids = dict.fromkeys(rated_book_ids, 1)
+        ratings = {book_id: stars for book_id, stars in rated_book_ids.items()
+                   if book_id in self.index}
+        if not ratings:
+            return []
+        positions = np.array([self.index[book_id] for book_id in ratings], dtype=np.int64)
+        stars = np.array(list(ratings.values()), dtype=np.float32)
+
+        user = stars @ self.factors[positions]
+        scores = self.factors @ user
+        scores[positions] = -np.inf
+        limit = min(limit, len(scores) - len(positions))
+        if limit <= 0:
+            return []
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [int(book_id) for book_id in self.book_ids[best[scores[best] > 0]]]
+
+
+def compute_model(factors: int = DEFAULT_FACTORS) -> LatentFactorModel:
+    """
+    Factorize the current ratings into ``factors`` latent factors per book.
+    """
+    return model_from_ratings(*ratings_matrix(), factors=factors)
+
+def model_from_ratings(matrix: sparse.csr_matrix, book_ids: np.ndarray,
+                       factors: int = DEFAULT_FACTORS) -> LatentFactorModel:
+    """
+    Factorize a ratings matrix into ``factors`` latent factors per book.
+    """
+    factors = min(factors, *matrix.shape)
+    if not matrix.nnz or not factors:
+        return LatentFactorModel(book_ids, np.zeros((len(book_ids), 0), dtype=np.float32))
+    _, _, components = randomized_svd(matrix, factors, random_state=0)
+    return LatentFactorModel(book_ids, np.ascontiguousarray(components.T, dtype=np.float32))
+
+def save_model(model: LatentFactorModel) -> str:
+    """
+    Save the model as a new version of the artifact and serve it from now on.
+    """
+    model.version = save_artifact(ARTIFACT, {'book_ids': model.book_ids,
+                                             'factors': model.factors},
+                                  {'books': len(model.book_ids),
+                                   'factors': int(model.factors.shape[1])})
+    return model.version
+
+
+_loaded = {}
+
+
+def load_model() -> LatentFactorModel | None:
+    """
+    Return the current version of the model, memory-mapped and kept per process.
+    """
+    version = current_version(ARTIFACT)
+    if version is None:
+        return None
+    if version not in _loaded:
+        arrays, _ = load_artifact(ARTIFACT, version)
+        _loaded.clear()
+        _loaded[version] = LatentFactorModel(arrays['book_ids'], arrays['factors'], version)
+    return _loaded[version]
@@ -0,0 +1,42 @@
+"""
+Management command that benchmarks the recommender engines on synthetic ratings.
+"""
+import json
+from django.core.management.base import BaseCommand
+from recommendations.benchmark import SCALES, run_benchmark
+from recommendations.engines import ENGINES
+
+
+class Command(BaseCommand):
+    """
+    Time and evaluate every recommender engine at several scales and write
+    the results as JSON, so they can be compared between releases.
+    """
+    help = 'Benchmark the recommender engines on synthetic ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES),
+                            help='Numbers of ratings to generate')
+        parser.add_argument('--engines', nargs='+', choices=list(ENGINES),
+                            default=list(ENGINES), help='Engines to benchmark')
+        parser.add_argument('-k', type=int, default=10,
+                            help='Number of recommendations evaluated per user')
+        parser.add_argument('--users', type=int, default=500,
+                            help='Number of users evaluated per run')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='recommender-benchmark.json',
+                            help='File the JSON report is written to')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        report = run_benchmark(options['scales'], options['engines'], k,
+                               options['users'], options['seed'])
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+
+        for run in report['runs']:
+            self.stdout.write(
+                f"{run['scale']:>9} {run['engine']:<16} matrix {run['matrix_seconds']:.2f}s "
+                f"model {run['model_seconds']:.2f}s score {run['score_ms']:.2f}ms "
+                f"P@{k} {run[f'precision@{k}']:.3f} R@{k} {run[f'recall@{k}']:.3f}")
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
@@ -0,0 +1,35 @@
+"""
+Management command that builds the content similarity artifact.
+"""
+from django.core.management.base import BaseCommand
+from recommendations.artifacts import artifact_lock, prune_versions
+from recommendations.content_similarity import (ARTIFACT, DEFAULT_NEIGHBORS, compute_model,
+                                                dequeue_books, queued_books, save_model)
+
+
+class Command(BaseCommand):
+    """
+    Fit the TF-IDF weights on every book and find the similar books of each one.
+    Added and edited books are updated by ``update_content_similarity``, so this
+    is only needed to pick up new words and renamed tags, e.g. nightly from cron.
+    The books queued before the build started are taken off the queue.
+    """
+    help = 'Build the content based similar books of the book pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=DEFAULT_NEIGHBORS,
+                            help='Number of similar books kept for every book')
+        parser.add_argument('--keep', type=int, default=2,
+                            help='Number of versions kept on disk')
+
+    def handle(self, *args, **options):
+        queued = queued_books()
+        model = compute_model(options['neighbors'])
+        with artifact_lock(ARTIFACT):
+            version = save_model(model)
+        dequeue_books(queued)
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved content similarity {version} for {len(model.book_ids)} books '
+            f'and {len(model.terms)} terms'))
+        for removed in prune_versions(ARTIFACT, max(options['keep'], 1)):
+            self.stdout.write(f'Removed content similarity {removed}')
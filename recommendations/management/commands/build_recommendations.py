@@ -0,0 +1,66 @@
+"""
+Management command that builds the recommender model artifacts.
+"""
+import time
+from django.core.management.base import BaseCommand
+from recommendations import latent_factors
+from recommendations.artifacts import prune_versions
+from recommendations.engines import engine_name
+from recommendations.item_similarity import ARTIFACT, DEFAULT_NEIGHBORS, compute_model, save_model
+from recommendations.neighbors import refresh_neighbors
+
+
+class Command(BaseCommand):
+    """
+    Compute the item similarity model from the ratings, save it as a new version
+    and refresh the "readers also liked" table from it.
+
+    The model is computed on a process pool, a range of book ids per task, and
+    written next to the version being served, which is only replaced once the
+    new one is complete. Serving processes pick it up on their next request.
+    Run it from cron, or keep it running with ``--interval``.
+
+    The latent factor model is built as well when it is the configured engine.
+    """
+    help = 'Build the book similarity model used by the recommendations page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=DEFAULT_NEIGHBORS,
+                            help='Number of similar books kept for every book')
+        parser.add_argument('--factors', type=int, default=latent_factors.DEFAULT_FACTORS,
+                            help='Number of latent factors of the latent factor engine')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of worker processes (defaults to the CPU count)')
+        parser.add_argument('--keep', type=int, default=2,
+                            help='Number of model versions kept on disk')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Rebuild every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        while True:
+            self.build(options)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def build(self, options):
+        """
+        Build, publish and clean up one version of the model.
+        """
+        model = compute_model(options['neighbors'], workers=options['workers'])
+        version = save_model(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved similarity model {version} for {len(model.book_ids)} books'))
+        rows = refresh_neighbors(model)
+        self.stdout.write(self.style.SUCCESS(f'Stored {rows} book neighbors'))
+        for removed in prune_versions(ARTIFACT, max(options['keep'], 1)):
+            self.stdout.write(f'Removed similarity model {removed}')
+
+        if engine_name() == 'latent_factors':
+            factor_model = latent_factors.compute_model(options['factors'])
+            version = latent_factors.save_model(factor_model)
+            self.stdout.write(self.style.SUCCESS(
+                f'Saved latent factor model {version} with '
+                f'{factor_model.factors.shape[1]} factors'))
+            for removed in prune_versions(latent_factors.ARTIFACT, max(options['keep'], 1)):
+                self.stdout.write(f'Removed latent factor model {removed}')
@@ -0,0 +1,17 @@
+"""
+Management command that rebuilds the "frequently bought together" counts.
+"""
+from django.core.management.base import BaseCommand
+from recommendations.co_purchases import rebuild_co_purchases
+
+
+class Command(BaseCommand):
+    """
+    Recompute the purchase and co-purchase counts from the order history,
+    e.g. after importing old orders.
+    """
+    help = 'Rebuild the frequently bought together counts from the order items'
+
+    def handle(self, *args, **options):
+        pairs = rebuild_co_purchases()
+        self.stdout.write(self.style.SUCCESS(f'Stored {pairs} co-purchased pairs of books'))
@@ -0,0 +1,17 @@
+"""
+Management command that refreshes the popularity rankings.
+"""
+from django.core.management.base import BaseCommand
+from recommendations.popularity import refresh_popularity
+
+
+class Command(BaseCommand):
+    """
+    Recompute the overall and per tag popularity of every book from the
+    ratings and the recent sales. Meant to run daily from cron.
+    """
+    help = 'Refresh the popularity rankings of the cold start recommendations'
+
+    def handle(self, *args, **options):
+        books = refresh_popularity()
+        self.stdout.write(self.style.SUCCESS(f'Ranked the popularity of {books} books'))
@@ -0,0 +1,24 @@
+"""
+Management command that applies the queued book changes to the content similarity.
+"""
+from django.core.management.base import BaseCommand
+from recommendations.content_similarity import update_queued_books
+
+
+class Command(BaseCommand):
+    """
+    Update the content similarity of the books added, edited or deleted since
+    the last run, in one batch, from the queue filled as they are saved.
+    Meant to run every few minutes from cron.
+    """
+    help = 'Update the content based similar books of the changed books'
+
+    def handle(self, *args, **options):
+        books, version = update_queued_books()
+        if version is not None:
+            self.stdout.write(self.style.SUCCESS(
+                f'Saved content similarity {version} for {books} changed books'))
+        elif books:
+            self.stdout.write(f'Skipped {books} changed books until the next full build')
+        else:
+            self.stdout.write('No changed books')
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:23
+"""
+Module for 1 migration
+"""
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    First migration
+    """
+    initial = True
+
+    dependencies = [
+        ('accounts', '0028_book_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='accounts.book')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-score', 'neighbor'], name='book_neighbor_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'neighbor'), name='book_neighbor_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:29
+"""
+Module for 2 migration
+"""
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Second migration
+    """
+    dependencies = [
+        ('accounts', '0028_book_fts'),
+        ('recommendations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPurchaseCount',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='purchase_count', serialize=False, to='accounts.book')),
+                ('orders', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookCoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_purchases', to='accounts.book')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-orders'], name='book_co_purchase_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'other'), name='book_co_purchase_unique')],
+            },
+        ),
+    ]
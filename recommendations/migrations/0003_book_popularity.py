@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:31
+"""
+Module for 3 migration
+"""
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Third migration
+    """
+    dependencies = [
+        ('accounts', '0028_book_fts'),
+        ('recommendations', '0002_co_purchases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='accounts.book')),
+                ('tag', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.tag')),
+            ],
+            options={
+                'verbose_name_plural': 'Book popularity',
+                'indexes': [models.Index(fields=['tag', '-score', 'book'], name='book_popularity_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tag', 'book'), name='book_popularity_unique_tag'), models.UniqueConstraint(condition=models.Q(('tag__isnull', True)), fields=('book',), name='book_popularity_unique_book')],
+            },
+        ),
+    ]
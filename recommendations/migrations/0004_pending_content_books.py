@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 21:12
+"""
+Module for 4 migration
+"""
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Fourth migration
+    """
+    dependencies = [
+        ('recommendations', '0003_book_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingContentBook',
+            fields=[
+                ('book_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
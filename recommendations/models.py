@@ -0,0 +1,115 @@
+"""
+This module contains the models of the recommendations app.
+"""
+from django.db import models
+from django.utils import timezone
+from accounts.models import Book, Tag
+
+
+class BookNeighbor(models.Model):
+    """
+    Materialized "readers also liked" list.
+
+    Holds the top-K most similar books of every book by the ratings of their
+    readers, so the book page reads a pre-sorted list with one indexed lookup.
+    """
+    book = models.ForeignKey(Book, related_name='neighbors', on_delete=models.CASCADE)
+    neighbor = models.ForeignKey(Book, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        """
+        One row per book and neighbor, indexed in ranking order
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'neighbor'], name='book_neighbor_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['book', '-score', 'neighbor'], name='book_neighbor_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.book} - {self.neighbor}: {self.score:.3f}'
+
+
+class BookPurchaseCount(models.Model):
+    """
+    Number of orders containing a book, the support of the book in the
+    "frequently bought together" rankings.
+    """
+    book = models.OneToOneField(Book, related_name='purchase_count', on_delete=models.CASCADE,
+                                primary_key=True)
+    orders = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.book}: {self.orders}'
+
+
+class BookCoPurchase(models.Model):
+    """
+    Number of orders containing both a book and another one.
+
+    Kept in both directions and updated as orders are placed, so "frequently
+    bought together" never reads the order history.
+    """
+    book = models.ForeignKey(Book, related_name='co_purchases', on_delete=models.CASCADE)
+    other = models.ForeignKey(Book, related_name='+', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        One row per pair of books, indexed by the most frequent pairs of a book
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'other'], name='book_co_purchase_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['book', '-orders'], name='book_co_purchase_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.book} + {self.other}: {self.orders}'
+
+
+class BookPopularity(models.Model):
+    """
+    Materialized popularity ranking of the cold start recommendations.
+
+    Holds the popularity score of every book, overall (no tag) and per tag,
+    so visitors without ratings get suggestions with one indexed query.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True)
+    book = models.ForeignKey(Book, related_name='popularity', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        """
+        One row per tag and book, indexed in ranking order
+        """
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'book'], name='book_popularity_unique_tag'),
+            models.UniqueConstraint(fields=['book'], condition=models.Q(tag__isnull=True),
+                                    name='book_popularity_unique_book'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-score', 'book'], name='book_popularity_idx'),
+        ]
+        verbose_name_plural = 'Book popularity'
+
+    def __str__(self):
+        return f'{self.tag or "All"} - {self.book}: {self.score:.2f}'
+
+
+class PendingContentBook(models.Model):
+    """
+    Book added, edited or deleted since the content similarity was last updated.
+
+    Queued in the transaction that changes the book, so a rolled back change
+    is never queued, and drained by the ``update_content_similarity`` command.
+    Deleted books stay queued, so it isn't a foreign key.
+    """
+    book_id = models.PositiveIntegerField(primary_key=True)
+    queued_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'Book {self.book_id} queued at {self.queued_at}'
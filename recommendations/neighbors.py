@@ -0,0 +1,61 @@
+"""
+The "readers also liked" table of the book page.
+
+The top neighbors of every book in the item similarity model are copied
+into ``BookNeighbor``, a batch of books at a time, so the book page reads
+them with a single indexed lookup and never touches the model itself.
+"""
+import numpy as np
+from django.db import transaction
+from .item_similarity import ItemSimilarityModel
+from .models import BookNeighbor
+
+# Number of neighbors stored for every book
+STORED_NEIGHBORS = 20
+
+# Books whose neighbors are replaced in one transaction
+BATCH_SIZE = 500
+
+
+def neighbor_rows(model: ItemSimilarityModel, start: int, stop: int,
+                  neighbors: int = STORED_NEIGHBORS) -> list[BookNeighbor]:
+    """
+    The strongest ``neighbors`` of the books in rows ``start:stop`` of the model.
+    """
+    rows = []
+    similarity = model.similarity
+    for position in range(start, stop):
+        first, last = similarity.indptr[position], similarity.indptr[position + 1]
+        scores = np.asarray(similarity.data[first:last])
+        columns = np.asarray(similarity.indices[first:last])
+        for best in np.argsort(-scores, kind='stable')[:neighbors]:
+            rows.append(BookNeighbor(book_id=int(model.book_ids[position]),
+                                     neighbor_id=int(model.book_ids[columns[best]]),
+                                     score=float(scores[best])))
+    return rows
+
+def refresh_neighbors(model: ItemSimilarityModel, neighbors: int = STORED_NEIGHBORS,
+                      batch_size: int = BATCH_SIZE) -> int:
+    """
+    Replace the stored neighbors of every book of the model, one batch of books
+    per transaction. Returns how many rows were written.
+    """
+    written = 0
+    for start in range(0, len(model.book_ids), batch_size):
+        stop = min(start + batch_size, len(model.book_ids))
+        rows = neighbor_rows(model, start, stop, neighbors)
+        with transaction.atomic():
+            BookNeighbor.objects.filter(
+                book_id__in=[int(book_id) for book_id in model.book_ids[start:stop]]).delete()
+            BookNeighbor.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return written
+
+def also_liked(book_id: int, limit: int = 4) -> list:
+    """
+    The books most liked by the readers of a book, best first.
+    """
+    neighbors = (BookNeighbor.objects.filter(book_id=book_id)
+                 .select_related('neighbor')
+                 .order_by('-score', 'neighbor_id')[:limit])
+    return [neighbor.neighbor for neighbor in neighbors]
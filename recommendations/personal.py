@@ -0,0 +1,47 @@
+"""
+Cached personal recommendations of the recommendations page.
+
+The list of a user is cached under the user's version counter and the version
+of the model it was computed with. The counter is bumped whenever the user
+writes or deletes a review, and a new model version changes the key by itself,
+so a repeat visit is a single cache hit and a new rating shows up right away.
+"""
+from django.core.cache import cache
+from accounts.cards import bump_version, get_versions
+from accounts.models import ProductReviews
+from .engines import engine_name, get_engine
+
+RECOMMENDATIONS_TIMEOUT = 60 * 60 * 24
+
+
+def user_version_key(user_id: int) -> str:
+    """
+    Cache key of the version counter of the recommendations of a user.
+    """
+    return f'recommendations_version:{user_id}'
+
+def bump_user_version(user_id: int):
+    """
+    Invalidate the cached recommendations of a user after their ratings changed.
+    """
+    bump_version(user_version_key(user_id))
+
+def recommended_book_ids(user_id: int, limit: int = 3) -> tuple[bool, list[int]]:
+    """
+    Whether the user rated any book, and the ids of the books recommended
+    to them from their ratings, best first.
+    """
+    model = get_engine().load_model()
+    key = user_version_key(user_id)
+    version = get_versions([key])[key]
+    cache_key = (f'recommendations:{user_id}:{limit}:{version}:'
+                 f'{engine_name()}:{model.version if model else ""}')
+
+    result = cache.get(cache_key)
+    if result is None:
+        rated = dict(ProductReviews.objects.filter(user_id=user_id)
+                     .values_list('book_id', 'stars'))
+        book_ids = model.recommend(rated, limit) if model and rated else []
+        result = (bool(rated), book_ids)
+        cache.set(cache_key, result, RECOMMENDATIONS_TIMEOUT)
+    return result
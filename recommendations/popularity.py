@@ -0,0 +1,85 @@
+"""
+Popularity ranking used when there is nothing personal to recommend.
+
+Every book is scored with the Bayesian average of its ratings, which pulls
+books with few reviews towards the mean of all reviews, plus a bonus for its
+recent sales. The scores are materialized overall and per tag by the
+``refresh_popularity`` command, meant to run from cron, so anonymous visitors
+and readers without ratings get suggestions with a single indexed query.
+"""
+import datetime
+import math
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from accounts.models import Book, ProductReviews
+from payment.models import BookDailySales
+from payment.rankings import book_tags
+from .models import BookPopularity
+
+# Number of mean ratings every book starts with in the Bayesian average
+PRIOR_RATINGS = 5
+
+# Days of sales counted, and weight of the log of the units sold in the score
+SALES_DAYS = 30
+SALES_WEIGHT = 0.5
+
+
+def popularity_scores(today: datetime.date | None = None) -> dict[int, float]:
+    """
+    The popularity score of every book.
+    """
+    today = today or timezone.localdate()
+    ratings = {row['book_id']: (row['count'], row['total']) for row in
+               ProductReviews.objects.values('book_id').annotate(count=Count('id'),
+                                                                 total=Sum('stars'))}
+    sales = dict(BookDailySales.objects.filter(day__gt=today - datetime.timedelta(SALES_DAYS))
+                 .values('book_id').annotate(units=Sum('units')).values_list('book_id', 'units'))
+
+    reviews = sum(count for count, _ in ratings.values())
+    mean = sum(total for _, total in ratings.values()) / reviews if reviews else 0
+    scores = {}
+    for book_id in Book.objects.values_list('id', flat=True):
+        count, total = ratings.get(book_id, (0, 0))
+        average = (PRIOR_RATINGS * mean + total) / (PRIOR_RATINGS + count)
+        scores[book_id] = average + SALES_WEIGHT * math.log1p(sales.get(book_id, 0))
+    return scores
+
+def refresh_popularity(today: datetime.date | None = None) -> int:
+    """
+    Recompute the overall and per tag popularity rankings.
+    Returns the number of books ranked.
+    """
+    scores = popularity_scores(today)
+    tags = book_tags(scores.keys())
+    rows = []
+    for book_id, score in scores.items():
+        rows.append(BookPopularity(book_id=book_id, score=score))
+        for tag_id in tags[book_id]:
+            rows.append(BookPopularity(tag_id=tag_id, book_id=book_id, score=score))
+    with transaction.atomic():
+        BookPopularity.objects.all().delete()
+        BookPopularity.objects.bulk_create(rows, batch_size=1000)
+    return len(scores)
+
+def popular_books(limit: int = 3, tag_id: int | None = None, user=None) -> list[Book]:
+    """
+    The ``limit`` most popular books, overall or for one tag, in a single indexed
+    query. The books ``user`` already reviewed are left out. Until
+    ``refresh_popularity`` has scored any books for the tag, the newest ones
+    are returned instead.
+    """
+    reviewed = ProductReviews.objects.filter(user=user).values('book')
+    ranks = BookPopularity.objects.filter(tag_id=tag_id)
+    if user is not None:
+        ranks = ranks.exclude(book__in=reviewed)
+    ranks = ranks.select_related('book').order_by('-score', 'book_id')[:limit]
+    books = [rank.book for rank in ranks]
+    if books:
+        return books
+    newest = Book.objects.all()
+    if tag_id is not None:
+        newest = newest.filter(tags=tag_id)
+    if user is not None:
+        newest = newest.exclude(id__in=reviewed)
+    return list(newest.order_by(F('data_created').desc(nulls_last=True), '-id')[:limit])
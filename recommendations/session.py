@@ -0,0 +1,50 @@
+"""
+Recommendations for shoppers who aren't logged in.
+
+The books in the session cart and the books recently viewed in the session
+are scored against the precomputed item similarity artifact, which is already
+memory-mapped, so a guest's suggestions cost a few sparse row reads and
+no matrix is ever built during the request.
+"""
+from .item_similarity import load_model
+
+RECENTLY_VIEWED_KEY = 'recently_viewed'
+RECENTLY_VIEWED_LIMIT = 10
+
+# Books in the cart count more than books only looked at
+CART_WEIGHT = 2.0
+VIEWED_WEIGHT = 1.0
+
+
+def remember_viewed(session, book_id: int):
+    """
+    Put a book first in the recently viewed books of the session. Visitors
+    without a session yet are not remembered, so crawlers and passing guests
+    don't get a session saved for every book page they open.
+    """
+    if session.session_key is None:
+        return
+    viewed = session.get(RECENTLY_VIEWED_KEY, [])
+    if viewed[:1] == [book_id]:
+        return
+    viewed = [book_id] + [other for other in viewed if other != book_id]
+    session[RECENTLY_VIEWED_KEY] = viewed[:RECENTLY_VIEWED_LIMIT]
+
+def session_books(session) -> dict[int, float]:
+    """
+    The books in the session cart and the recently viewed ones, with their weights.
+    """
+    books = dict.fromkeys(session.get(RECENTLY_VIEWED_KEY, []), VIEWED_WEIGHT)
+    for book_id in session.get('session_key', {}):
+        books[int(book_id)] = CART_WEIGHT
+    return books
+
+def session_book_ids(session, limit: int = 4) -> list[int]:
+    """
+    Ids of the books most similar to the ones of the session, best first.
+    """
+    books = session_books(session)
+    model = load_model()
+    if not books or model is None:
+        return []
+    return model.recommend(books, limit)
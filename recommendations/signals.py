@@ -0,0 +1,60 @@
+"""
+Signal handlers keeping the recommendations in sync with the ratings and the books.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from accounts.models import Book, ProductReviews
+from .content_similarity import queue_books
+from .personal import bump_user_version
+
+# Book fields the content similarity is computed from, besides the tags
+CONTENT_FIELDS = ('descreption', 'author')
+
+
+@receiver([post_save, post_delete], sender=ProductReviews)
+def invalidate_user_recommendations(sender, instance, **kwargs):
+    """
+    Drop the cached recommendations of a user when one of their reviews changes.
+    """
+    bump_user_version(instance.user_id)
+
+
+@receiver(pre_save, sender=Book)
+def remember_content_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Compare the content fields of an edited book with the saved ones, so that
+    saving its price or stock doesn't update the content similarity.
+    """
+    if instance.pk is None:
+        instance.content_changed = True
+    elif update_fields is not None and not set(update_fields) & set(CONTENT_FIELDS):
+        instance.content_changed = False
+    else:
+        saved = sender._default_manager.filter(pk=instance.pk).values_list(*CONTENT_FIELDS).first()
+        instance.content_changed = saved != tuple(getattr(instance, name)
+                                                  for name in CONTENT_FIELDS)
+
+@receiver(post_save, sender=Book)
+def queue_book_content(sender, instance, **kwargs):
+    """
+    Queue an added book, or a book whose content changed, for the content similarity.
+    """
+    if getattr(instance, 'content_changed', True):
+        queue_books([instance.id])
+
+@receiver(post_delete, sender=Book)
+def queue_deleted_book_content(sender, instance, **kwargs):
+    """
+    Queue a deleted book to be dropped from the content similarity.
+    """
+    queue_books([instance.id])
+
+@receiver(m2m_changed, sender=Book.tags.through)
+def queue_tagged_book_content(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Queue the books whose tags changed for the content similarity.
+    """
+    if not action.startswith('post_') or (action == 'post_clear' and reverse):
+        # Renamed and cleared tags are picked up by the next full build
+        return
+    queue_books([instance.id] if not reverse else list(pk_set))
@@ -0,0 +1,561 @@
+"""
+Module for testing the recommendations app.
+"""
+import json
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from accounts.models import Book, ProductReviews, Tag
+from payment.models import Order, OrderItem
+from payment.rankings import record_sales
+from .benchmark import split_ratings, synthetic_ratings
+from .artifacts import artifact_dir, current_version, prune_versions
+from . import item_similarity, latent_factors
+from .item_similarity import (ARTIFACT, compute_model, load_model, ratings_matrix,
+                              save_model)
+from . import content_similarity
+from .co_purchases import bought_together, rebuild_co_purchases, record_basket
+from .models import BookCoPurchase, BookNeighbor, BookPopularity, BookPurchaseCount
+from .popularity import popular_books, refresh_popularity
+from . import session as session_recommendations
+from .session import session_book_ids
+from .neighbors import also_liked, refresh_neighbors
+from .personal import recommended_book_ids
+
+
+class ItemSimilarityTests(TestCase):
+    """
+    Test case for the precomputed item similarity model.
+    """
+    def setUp(self):
+        """
+        Create books, readers and their ratings, and a fresh artifact directory.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_override = self.settings(RECOMMENDER_ROOT=directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        cache.clear()
+
+        self.books = {title: Book.objects.create(title=title, price=10,
+                                                 image='uploads/books/x.png')
+                      for title in ('Dune', 'Hyperion', 'Emma', 'Persuasion')}
+        self.readers = [User.objects.create(username=f'reader{i}') for i in range(3)]
+        ratings = [(0, 'Dune', 5), (0, 'Hyperion', 5), (1, 'Dune', 4), (1, 'Hyperion', 5),
+                   (2, 'Emma', 5), (2, 'Persuasion', 4)]
+        for reader, title, stars in ratings:
+            ProductReviews.objects.create(user=self.readers[reader], book=self.books[title],
+                                          stars=stars)
+
+    def test_recommends_books_rated_by_similar_readers(self):
+        """
+        Test that the most similar unrated books come first and rated books are left out.
+        """
+        model = compute_model()
+        self.assertEqual(model.recommend([self.books['Dune'].id], 1),
+                         [self.books['Hyperion'].id])
+        self.assertEqual(model.recommend([self.books['Emma'].id], 3),
+                         [self.books['Persuasion'].id])
+        self.assertEqual(model.recommend([0]), [])
+
+    def test_ratings_matrix_is_built_in_one_query_per_table(self):
+        """
+        Test that the sparse ratings matrix maps every review to its user row and book column.
+        """
+        with self.assertNumQueries(2):
+            matrix, book_ids = ratings_matrix()
+        self.assertEqual(matrix.shape, (3, 4))
+        self.assertEqual(matrix.nnz, 6)
+        column = int(np.searchsorted(book_ids, self.books['Persuasion'].id))
+        self.assertEqual(matrix[:, column].toarray().ravel().tolist(), [0, 0, 4])
+
+    def test_similarity_blocks_match_a_single_block(self):
+        """
+        Test that computing the similarities a few books at a time gives the same model.
+        """
+        whole = compute_model().similarity.toarray()
+        with mock.patch.object(item_similarity, 'BLOCK_CELLS', 1):
+            blocks = compute_model().similarity.toarray()
+        np.testing.assert_allclose(blocks, whole)
+
+    def test_similarity_shards_on_a_process_pool(self):
+        """
+        Test that the book id ranges computed by worker processes give the same model.
+        """
+        whole = compute_model().similarity.toarray()
+        with mock.patch.object(item_similarity, 'BLOCK_CELLS', 4):
+            sharded = compute_model(workers=2).similarity.toarray()
+        np.testing.assert_allclose(sharded, whole)
+
+    def test_serving_switches_to_new_version(self):
+        """
+        Test that a loaded model is replaced by the next saved version and old ones are pruned.
+        """
+        first = save_model(compute_model())
+        self.assertEqual(load_model().version, first)
+        second = save_model(compute_model(neighbors=1))
+        self.assertEqual(load_model().version, second)
+
+        third = save_model(compute_model())
+        self.assertEqual(prune_versions(ARTIFACT, keep=2), [first])
+        self.assertEqual(sorted(path.name for path in artifact_dir(ARTIFACT).iterdir()
+                                if path.is_dir()), [second, third])
+
+    def test_saved_model_is_served_from_disk(self):
+        """
+        Test that saving a model flips the current version and loads it back memory-mapped.
+        """
+        self.assertIsNone(load_model())
+        version = save_model(compute_model(neighbors=1))
+        self.assertEqual(current_version(ARTIFACT), version)
+
+        model = load_model()
+        self.assertEqual(model.version, version)
+        self.assertLessEqual(max(model.similarity.getnnz(axis=1)), 1)
+        self.assertEqual(model.recommend([self.books['Hyperion'].id], 1),
+                         [self.books['Dune'].id])
+
+    def test_recommendations_view_uses_saved_model(self):
+        """
+        Test that the recommendations page shows the books of the saved model.
+        """
+        save_model(compute_model())
+        ProductReviews.objects.filter(user=self.readers[0], book=self.books['Hyperion']).delete()
+        self.client.force_login(self.readers[0])
+
+        response = self.client.get(reverse('recommendations'))
+        self.assertEqual(list(response.context['recommended_books']), [self.books['Hyperion']])
+
+    def test_neighbor_table_is_refreshed_in_batches(self):
+        """
+        Test that every book gets its strongest neighbors and stale rows are replaced.
+        """
+        dune, hyperion = self.books['Dune'], self.books['Hyperion']
+        BookNeighbor.objects.create(book=dune, neighbor=self.books['Emma'], score=1)
+
+        written = refresh_neighbors(compute_model(), neighbors=1, batch_size=3)
+        self.assertEqual(written, 4)
+        self.assertEqual(list(BookNeighbor.objects.filter(book=dune)
+                              .values_list('neighbor', flat=True)), [hyperion.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(also_liked(hyperion.id), [dune])
+
+    def test_book_page_shows_readers_also_liked(self):
+        """
+        Test that the book page lists the stored neighbors of the book.
+        """
+        refresh_neighbors(compute_model())
+        response = self.client.get(reverse('book', args=[self.books['Emma'].id]))
+        self.assertEqual(response.context['also_liked'], [self.books['Persuasion']])
+        self.assertContains(response, 'Readers also liked')
+
+    def test_personal_recommendations_are_cached_until_a_rating_changes(self):
+        """
+        Test that a repeat visit is served from the cache and a new rating or model replaces it.
+        """
+        reader = self.readers[2]
+        save_model(compute_model())
+        self.assertEqual(recommended_book_ids(reader.id), (True, []))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(recommended_book_ids(reader.id), (True, []))
+        # Only the database cache backend is read
+        self.assertEqual([query['sql'] for query in queries
+                          if 'django_cache' not in query['sql']], [])
+
+        ProductReviews.objects.create(user=self.readers[1], book=self.books['Emma'], stars=5)
+        save_model(compute_model())
+        self.assertCountEqual(recommended_book_ids(reader.id)[1],
+                              [self.books['Dune'].id, self.books['Hyperion'].id])
+
+        ProductReviews.objects.filter(user=reader).delete()
+        self.assertEqual(recommended_book_ids(reader.id), (False, []))
+
+    def test_latent_factor_engine_scores_every_book(self):
+        """
+        Test that the factorized ratings rank the books liked by similar readers first.
+        """
+        model = latent_factors.compute_model(factors=2)
+        self.assertEqual(model.factors.shape, (4, 2))
+        self.assertEqual(model.recommend({self.books['Dune'].id: 5}, 1),
+                         [self.books['Hyperion'].id])
+        self.assertEqual(model.recommend([self.books['Persuasion'].id], 1),
+                         [self.books['Emma'].id])
+        self.assertEqual(model.recommend([0]), [])
+
+    def test_recommendations_view_uses_configured_engine(self):
+        """
+        Test that the recommendations page is served by the latent factor model when selected.
+        """
+        latent_factors.save_model(latent_factors.compute_model(factors=2))
+        ProductReviews.objects.filter(user=self.readers[1], book=self.books['Dune']).delete()
+        self.client.force_login(self.readers[1])
+
+        with self.settings(RECOMMENDER_ENGINE='latent_factors'):
+            response = self.client.get(reverse('recommendations'))
+        self.assertEqual(list(response.context['recommended_books']), [self.books['Dune']])
+
+    def test_guests_get_recommendations_from_their_session(self):
+        """
+        Test that the cart and the recently viewed books of a guest are scored
+        against the saved model, viewed books being remembered by the book page.
+        """
+        save_model(compute_model())
+        self.client.session.save()
+        self.client.get(reverse('book', args=[self.books['Emma'].id]))
+        self.assertEqual(self.client.session['recently_viewed'], [self.books['Emma'].id])
+
+        response = self.client.get(reverse('session_recommendations'))
+        self.assertTrue(response.json()['personal'])
+        self.assertEqual([book['id'] for book in response.json()['books']],
+                         [self.books['Persuasion'].id])
+
+        session = self.client.session
+        session['session_key'] = {str(self.books['Dune'].id): 1}
+        session.save()
+        self.assertEqual(session_book_ids(self.client.session, 1), [self.books['Hyperion'].id])
+        response = self.client.get(reverse('cart_summary'))
+        self.assertIn(self.books['Hyperion'], response.context['you_may_like'])
+
+    def test_recently_viewed_books_are_capped(self):
+        """
+        Test that only the latest viewed books are kept, most recent first.
+        """
+        dune, emma, hyperion = self.books['Dune'], self.books['Emma'], self.books['Hyperion']
+        self.client.session.save()
+        with mock.patch.object(session_recommendations, 'RECENTLY_VIEWED_LIMIT', 2):
+            for book in (dune, emma, hyperion, emma):
+                self.client.get(reverse('book', args=[book.id]))
+        self.assertEqual(self.client.session['recently_viewed'], [emma.id, hyperion.id])
+
+    def test_book_view_does_not_start_a_session(self):
+        """
+        Test that a visitor without a session can open a book page without getting one.
+        """
+        response = self.client.get(reverse('book', args=[self.books['Emma'].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+
+class BenchmarkTests(TestCase):
+    """
+    Test case for the recommender benchmark.
+    """
+    def test_synthetic_ratings_rate_each_book_once_per_reader(self):
+        """
+        Test that the generated ratings have the requested scale and no duplicate pairs.
+        """
+        ratings, book_ids = synthetic_ratings(10000, seed=1)
+        pairs = set(zip(ratings['user'].tolist(), ratings['book'].tolist()))
+        self.assertEqual(len(pairs), len(ratings))
+        self.assertEqual(len(ratings), 10000)
+        self.assertTrue(np.isin(ratings['book'], book_ids).all())
+
+        train, test = split_ratings(ratings)
+        self.assertEqual(len(train) + len(test), len(ratings))
+
+    def test_synthetic_ratings_unique_when_draws_run_out(self):
+        """
+        Test that the ratings have no duplicate pairs when the extra draws don't reach the scale.
+        """
+        ratings, _ = synthetic_ratings(5000, skew=3)
+        self.assertLess(len(ratings), 5000)
+        pairs = set(zip(ratings['user'].tolist(), ratings['book'].tolist()))
+        self.assertEqual(len(pairs), len(ratings))
+
+    def test_command_writes_json_report(self):
+        """
+        Test that every engine is timed and evaluated at every scale.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            call_command('benchmark_recommendations', scales=[1000, 2000], users=20,
+                         output=output, stdout=open(os.devnull, 'w', encoding='utf-8'))
+            with open(output, encoding='utf-8') as report_file:
+                report = json.load(report_file)
+
+        self.assertEqual([(run['scale'], run['engine']) for run in report['runs']],
+                         [(1000, 'item_similarity'), (1000, 'latent_factors'),
+                          (2000, 'item_similarity'), (2000, 'latent_factors')])
+        for run in report['runs']:
+            self.assertLessEqual(0, run['precision@10'])
+            self.assertLessEqual(run['recall@10'], 1)
+
+
+class CoPurchaseTests(TestCase):
+    """
+    Test case for the frequently bought together counts.
+    """
+    def setUp(self):
+        """
+        Create books and baskets where Dune sells with Hyperion and with the bestseller Emma.
+        """
+        self.dune, self.hyperion, self.emma, self.ulysses = [
+            Book.objects.create(title=title, price=10, image='uploads/books/x.png')
+            for title in ('Dune', 'Hyperion', 'Emma', 'Ulysses')]
+        self.baskets = [[self.dune, self.hyperion], [self.dune, self.hyperion],
+                        [self.dune, self.emma], [self.dune, self.emma], [self.emma],
+                        [self.emma], [self.emma], [self.ulysses, self.dune]]
+        for basket in self.baskets:
+            record_basket(book.id for book in basket)
+
+    def test_books_are_ranked_by_lift(self):
+        """
+        Test that books bought with a book more often than their popularity suggests come first,
+        and pairs bought only once are left out.
+        """
+        self.assertEqual(BookPurchaseCount.objects.get(book=self.dune).orders, 5)
+        self.assertEqual(BookCoPurchase.objects.get(book=self.emma, other=self.dune).orders, 2)
+        self.assertEqual(bought_together([self.dune.id]), [self.hyperion, self.emma])
+        self.assertEqual(bought_together([self.dune.id, self.hyperion.id]), [self.emma])
+
+    def test_record_basket_queries_do_not_grow_with_the_order(self):
+        """
+        Test that counting a large order takes about as many queries as a small one.
+        """
+        books = [Book.objects.create(title=f'Book {number}', price=10,
+                                     image='uploads/books/x.png') for number in range(20)]
+        with CaptureQueriesContext(connection) as small:
+            record_basket([self.dune.id, self.emma.id])
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as large:
+                record_basket([book.id for book in books])
+            # The 380 pairs only split the insert in batches of the database's parameter limit
+            self.assertLessEqual(len(large), len(small) + 1)
+        self.assertEqual(BookCoPurchase.objects.filter(book__in=books).count(), 20 * 19)
+        self.assertEqual(set(BookCoPurchase.objects.filter(book__in=books)
+                             .values_list('orders', flat=True)), {2})
+        self.assertEqual(BookCoPurchase.objects.get(book=self.dune, other=self.emma).orders, 3)
+
+    def test_rebuild_matches_incremental_counts(self):
+        """
+        Test that recomputing from the order items gives the counts kept as orders are placed.
+        """
+        counts = sorted(BookCoPurchase.objects.values_list('book', 'other', 'orders'))
+        for basket in self.baskets:
+            order = Order.objects.create(full_name='Reader', email='reader@example.com',
+                                         shipping_address='Sofia', amount_paid=10)
+            for book in basket:
+                OrderItem.objects.create(order=order, book=book, price=book.price)
+
+        self.assertEqual(rebuild_co_purchases(), len(counts))
+        self.assertEqual(sorted(BookCoPurchase.objects.values_list('book', 'other', 'orders')),
+                         counts)
+
+    def test_cart_shows_books_bought_together(self):
+        """
+        Test that the cart page recommends from the counts of the books in the cart.
+        """
+        session = self.client.session
+        session['session_key'] = {str(self.hyperion.id): 1}
+        session.save()
+
+        response = self.client.get(reverse('cart_summary'))
+        self.assertEqual(response.context['bought_together'], [self.dune])
+        self.assertContains(response, 'Frequently bought together')
+
+
+class PopularityTests(TestCase):
+    """
+    Test case for the cold start popularity rankings.
+    """
+    def setUp(self):
+        """
+        Create a book with one perfect rating, a well rated classic and a recent bestseller.
+        """
+        self.tag = Tag.objects.create(name='Classics')
+        self.debut, self.classic, self.bestseller = [
+            Book.objects.create(title=title, price=10, image='uploads/books/x.png')
+            for title in ('Debut', 'Classic', 'Bestseller')]
+        self.classic.tags.add(self.tag)
+        readers = [User.objects.create(username=f'reader{i}') for i in range(10)]
+        ProductReviews.objects.create(user=readers[0], book=self.debut, stars=5)
+        for reader in readers:
+            ProductReviews.objects.create(user=reader, book=self.classic, stars=5)
+        ProductReviews.objects.create(user=readers[0], book=self.bestseller, stars=1)
+        record_sales({self.bestseller.id: 500})
+        self.reader = readers[1]
+        refresh_popularity()
+
+    def test_ratings_are_averaged_with_a_prior_and_sales_count(self):
+        """
+        Test that many good ratings beat a single one, recent sales lift a book, and tags are ranked.
+        """
+        with self.assertNumQueries(1):
+            books = popular_books(3)
+        self.assertEqual(books, [self.bestseller, self.classic, self.debut])
+        self.assertEqual(popular_books(3, self.tag.id), [self.classic])
+        self.assertEqual(popular_books(3, user=self.reader), [self.bestseller, self.debut])
+
+    def test_newest_books_until_the_first_refresh(self):
+        """
+        Test that the newest books are suggested before the popularity has ever been computed.
+        """
+        BookPopularity.objects.all().delete()
+        self.assertEqual(popular_books(2), [self.bestseller, self.classic])
+        self.assertEqual(popular_books(3, self.tag.id), [self.classic])
+        ProductReviews.objects.create(user=self.reader, book=self.bestseller, stars=3)
+        self.assertEqual(popular_books(2, user=self.reader), [self.debut])
+
+    def test_visitors_without_ratings_get_popular_books(self):
+        """
+        Test that anonymous visitors and readers without ratings see the popular books.
+        """
+        response = self.client.get(reverse('recommendations'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['popular'])
+        self.assertEqual(response.context['recommended_books'][0], self.bestseller)
+
+        self.client.force_login(User.objects.create(username='newcomer'))
+        response = self.client.get(reverse('recommendations'), {'tag': self.tag.id})
+        self.assertEqual(response.context['recommended_books'], [self.classic])
+        self.assertContains(response, 'Rate some books')
+
+
+class ContentSimilarityTests(TestCase):
+    """
+    Test case for the content based similar books.
+    """
+    def setUp(self):
+        """
+        Create space operas, period novels and the content artifact.
+        """
+        self.enterContext(self.settings(RECOMMENDER_ROOT=self.enterContext(
+            tempfile.TemporaryDirectory())))
+        self.space = Tag.objects.create(name='Space')
+        self.dune, self.hyperion, self.emma = [
+            Book.objects.create(title=title, author=author, descreption=description,
+                                image='uploads/books/x.png')
+            for title, author, description in (
+                ('Dune', 'Frank Herbert', 'A desert planet, spice and an empire of starships.'),
+                ('Hyperion', 'Dan Simmons', 'Pilgrims cross the empire on starships.'),
+                ('Emma', 'Jane Austen', 'A young woman matchmaking in a village.'))]
+        self.dune.tags.add(self.space)
+        self.hyperion.tags.add(self.space)
+        self.call('build_content_similarity')
+
+    def call(self, command):
+        """
+        Helper running a management command without output.
+        """
+        call_command(command, stdout=open(os.devnull, 'w', encoding='utf-8'))
+
+    def queued(self):
+        """
+        Helper returning the ids of the queued books.
+        """
+        return {book_id for book_id, _ in content_similarity.queued_books()}
+
+    def test_books_with_shared_words_and_tags_are_similar(self):
+        """
+        Test that the neighbors come from the description words and the tags.
+        """
+        self.assertEqual(self.queued(), set())
+        self.assertEqual(content_similarity.similar_books(self.dune.id), [self.hyperion.id])
+        self.assertEqual(content_similarity.similar_books(self.emma.id), [])
+        response = self.client.get(reverse('book', args=[self.hyperion.id]))
+        self.assertEqual(response.context['similar_books'], [self.dune])
+
+    def test_new_and_deleted_books_update_the_artifact(self):
+        """
+        Test that new, retagged and deleted books are applied by the update command.
+        """
+        persuasion = Book.objects.create(title='Persuasion', author='Jane Austen',
+                                         descreption='A woman meets her old love again.',
+                                         image='uploads/books/x.png')
+        self.assertEqual(content_similarity.similar_books(persuasion.id), [])
+        self.call('update_content_similarity')
+        self.assertEqual(content_similarity.similar_books(persuasion.id), [self.emma.id])
+        self.assertEqual(content_similarity.similar_books(self.emma.id), [persuasion.id])
+
+        self.emma.tags.add(self.space)
+        self.call('update_content_similarity')
+        self.assertIn(self.dune.id, content_similarity.similar_books(self.emma.id))
+
+        emma_id = self.emma.id
+        self.emma.delete()
+        self.call('update_content_similarity')
+        self.assertEqual(content_similarity.similar_books(persuasion.id), [])
+        self.assertEqual(content_similarity.similar_books(emma_id), [])
+        self.assertEqual(self.queued(), set())
+
+    def test_model_without_terms_is_not_updated(self):
+        """
+        Test that books saved while the model has no vocabulary wait for the next build.
+        """
+        Book.objects.all().delete()
+        content_similarity.save_model(content_similarity.compute_model())
+        book = Book.objects.create(title='Dune', author='Frank Herbert',
+                                   descreption='A desert planet.', image='uploads/books/x.png')
+        self.assertIsNone(content_similarity.update_books([book.id]))
+        self.assertEqual(content_similarity.similar_books(book.id), [])
+
+    def test_changes_are_queued_in_their_transaction(self):
+        """
+        Test that the books of a committed transaction are updated with a single new version,
+        and a rolled back one queues nothing.
+        """
+        with self.assertRaises(ValueError), transaction.atomic():
+            Book.objects.create(title='Sanditon', image='uploads/books/x.png')
+            raise ValueError
+        with transaction.atomic():
+            books = [Book.objects.create(title=title, author='Jane Austen',
+                                         descreption='A woman in a village.',
+                                         image='uploads/books/x.png')
+                     for title in ('Persuasion', 'Mansfield Park')]
+            books[0].tags.add(self.space)
+        self.assertEqual(self.queued(), {book.id for book in books})
+
+        with mock.patch('recommendations.content_similarity.save_model',
+                        wraps=content_similarity.save_model) as save:
+            self.call('update_content_similarity')
+        save.assert_called_once()
+        self.assertIn(self.emma.id, content_similarity.similar_books(books[1].id))
+        self.assertEqual(self.queued(), set())
+
+    def test_only_content_changes_are_queued(self):
+        """
+        Test that saving a book without changing its description, author or tags queues nothing.
+        """
+        self.dune.price = 12
+        self.dune.save()
+        self.dune.save(update_fields=['title'])
+        self.assertEqual(self.queued(), set())
+        self.emma.descreption = 'Pilgrims on starships cross a desert planet.'
+        self.emma.save()
+        self.assertEqual(self.queued(), {self.emma.id})
+        self.call('update_content_similarity')
+        self.assertIn(self.emma.id, content_similarity.similar_books(self.dune.id))
+
+    def test_books_queued_again_during_an_update_stay_queued(self):
+        """
+        Test that a failed update keeps the queue, and a book queued again while the
+        queue was applied is kept for the next run.
+        """
+        self.emma.tags.add(self.space)
+        with mock.patch('recommendations.content_similarity.update_books',
+                        side_effect=ValueError), self.assertRaises(ValueError):
+            self.call('update_content_similarity')
+        self.assertEqual(self.queued(), {self.emma.id})
+
+        update_books = content_similarity.update_books
+
+        def save_again(book_ids):
+            self.emma.tags.remove(self.space)
+            return update_books(book_ids)
+
+        with mock.patch('recommendations.content_similarity.update_books',
+                        side_effect=save_again):
+            self.call('update_content_similarity')
+        self.assertEqual(self.queued(), {self.emma.id})